@@ -3,12 +3,31 @@
 import os
 import sys
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from typing import Optional
 import getpass
 from dotenv import find_dotenv
 import re
+import fnmatch
 import json
+import hashlib
+import logging
+import logging.handlers
+import csv
+import html
+import gzip
+import socket
+import struct
+import ipaddress
+import time
+import itertools
+import random
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 def get_version_from_package_json():
     pkg_path = os.path.join(os.path.dirname(__file__), "package.json")
@@ -21,24 +40,12 @@ def get_version_from_package_json():
 
 __version__ = get_version_from_package_json()
 
-try:
-    from pyfiglet import figlet_format
-except ImportError:  # pragma: no cover - optional dependency
-    figlet_format = None
+# Colors are filled in by init_colors() once the CLI actually starts
+GREEN = RED = CYAN = YELLOW = RESET = ''
 
-# Color output for Windows
-try:
-    from colorama import init, Fore, Style
-    init()
-    GREEN = Fore.GREEN
-    RED = Fore.RED
-    CYAN = Fore.CYAN
-    YELLOW = Fore.YELLOW
-    RESET = Style.RESET_ALL
-except ImportError:
-    GREEN = RED = CYAN = YELLOW = RESET = ''
-
-load_dotenv()
+# Locate the .env file once (working directory first, then next to the script)
+DOTENV_PATH = find_dotenv(usecwd=True) or find_dotenv()
+load_dotenv(DOTENV_PATH)
 
 DEBUG = os.getenv('DEBUG', '0').lower() in ('1', 'true')
 CENSOR = os.getenv('CENSOR', '1').lower() in ('1', 'true', 'yes')
@@ -49,39 +56,213 @@ INTERACTIVE_ENV = False
 # Global config variables (will be set in init_env)
 CLOUDFLARE_API_TOKEN = None
 NEW_IP = None
+NEW_IPV6 = None
 OLD_IP = None
+IP_MAP = None
 TARGET_DOMAIN = None
 DRY_RUN = None
 DEBUG = None
 CENSOR = None
 HEADERS = None
-HTML_REPORT = None
-CHANGES = []
+REPORT_FILE = None
+SKIPPED_ROWS = 'keep'
+
+API_BASE = 'https://api.cloudflare.com/client/v4'
+# Cloudflare allows 1200 API requests per five minutes for each user/token
+DEFAULT_RATE_LIMIT = 4.0
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_POOL_SIZE = 10
+CLIENT = None
+# Maximum number of record changes sent in one dns_records/batch request
+BATCH_SIZE = 200
+# Most filtered dns_records queries sent per zone before fetching it whole
+MAX_RECORD_QUERIES = 4
+# Requests the async engine keeps in flight at once
+DEFAULT_MAX_IN_FLIGHT = 100
+RECORD_CACHE = None
+# Port and timeout of the SOA queries that check whether cached zones are current
+DNS_PORT = 53
+DNS_TIMEOUT = 2.0
+JOBS = []
+METRICS_OUT = None
+DEFAULT_JOURNAL_FILE = 'cf_journal.jsonl'
+JOURNAL_FILE = DEFAULT_JOURNAL_FILE
+JOURNAL = None
+DEFAULT_BACKUP_FILE = 'cf_backup.jsonl'
+DEFAULT_DEBUG_FILE = 'debug_output.txt'
+LOG_FORMAT = 'text'
+DEFAULT_IP_SOURCE = 'https://api.ipify.org'
+UPDATE_CHECK_TTL = 24 * 3600
+# Failed checks are retried sooner, but not on every run of an offline host
+UPDATE_CHECK_FAILURE_TTL = 3600
+UPDATE_CHECK_TIMEOUT = 3
+
+# Cloudflare supports a wide range of DNS record types.
+# This list determines which types we will iterate over when updating.
+RECORD_TYPES = [
+    'A', 'AAAA', 'CNAME', 'TXT', 'SRV', 'MX', 'NS', 'PTR', 'CAA', 'CERT', 'DNSKEY', 'DS', 'LOC', 'NAPTR', 'SMIMEA', 'SSHFP', 'SVCB', 'TLSA', 'URI'
+]
+
+# Per-record messages sit below INFO so --quiet can drop them before they
+# are formatted; SUCCESS sits between INFO and WARNING
+DETAIL = 15
+SUCCESS = 25
+logging.addLevelName(DETAIL, 'DETAIL')
+logging.addLevelName(SUCCESS, 'SUCCESS')
+LOG = logging.getLogger('cloudflare_update')
+LOG.propagate = False
+
+class ConsoleHandler(logging.StreamHandler):
+    """Stream handler writing to whatever ``sys.stdout`` is when a message is emitted."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def flush(self):
+        # Leave buffering to sys.stdout, as print() does
+        pass
+
+class TextFormatter(logging.Formatter):
+    """Format messages the way the CLI always printed them, colors included."""
+
+    def format(self, record):
+        kind = getattr(record, 'kind', record.levelname)
+        if kind == 'dryrun':
+            return f"{YELLOW}🟡 [DRY RUN] {record.getMessage()}{RESET}"
+        if kind == 'INFO':
+            return f"{CYAN}ℹ️  {record.getMessage()}{RESET}"
+        if kind == 'SUCCESS':
+            return f"{GREEN}✅ {record.getMessage()}{RESET}"
+        if kind in ('WARNING', 'ERROR', 'CRITICAL'):
+            return f"{RED}❌ {record.getMessage()}{RESET}"
+        return record.getMessage()
+
+class DetailBlock:
+    """Collect per-record text lines and log them ``limit`` at a time as one DETAIL message.
+
+    A log record per DNS record would cost more than matching the record,
+    so the text output of a zone goes out in a few large writes.
+    """
+
+    def __init__(self, limit=1000):
+        self.lines = []
+        self.limit = limit
+
+    def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            LOG.log(DETAIL, '\n'.join(self.lines))
+            self.lines = []
+
+class JsonFormatter(logging.Formatter):
+    """Format each message as one JSON object for log shippers."""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': getattr(record, 'kind', record.levelname).lower(),
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging(quiet=False, log_format='text', log_file=None, debug=False):
+    """(Re)configure the console handler and the optional log file.
 
-def log_info(msg: str):
-    print(f"{CYAN}ℹ️  {msg}{RESET}")
-    """Print an informational message in green."""
+    The console shows DETAIL and up, or only INFO and up with ``quiet``. The
+    log file also receives DEBUG messages with ``debug``; it stays
+    open for the whole run and is written in blocks, flushing right away
+    only for errors.
+    """
+    global LOG_FORMAT
+    LOG_FORMAT = log_format
+    for handler in list(LOG.handlers):
+        LOG.removeHandler(handler)
+        handler.close()
+    formatter = JsonFormatter() if log_format == 'json' else TextFormatter()
+    console = ConsoleHandler()
+    console.setLevel(logging.INFO if quiet else DETAIL)
+    console.setFormatter(formatter)
+    LOG.addHandler(console)
+    level = console.level
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
+        file_handler.setFormatter(formatter if log_format == 'json' else
+                                  logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        buffered = logging.handlers.MemoryHandler(1000, flushLevel=logging.ERROR, target=file_handler)
+        buffered.setLevel(logging.DEBUG if debug else DETAIL)
+        LOG.addHandler(buffered)
+        level = min(level, buffered.level)
+    LOG.setLevel(level)
 
-def log_success(msg: str):
-    """Print a success message."""
-    print(f"{GREEN}✅ {msg}{RESET}")
+setup_logging()
 
-def log_error(msg: str):
-    """Print an error message in red."""
-    print(f"{RED}❌ {msg}{RESET}")
+def log_fields(fields):
+    """Return the ``extra`` carrying structured ``fields``; only the JSON format shows them."""
+    return {'fields': fields} if fields and LOG_FORMAT == 'json' else None
 
-def log_dryrun(msg: str):
-    print(f"{YELLOW}🟡 [DRY RUN] {msg}{RESET}")
-    """Print a message when running with --dry-run."""
+def log_detail(msg: str, *args, **fields):
+    """Log a per-record message; ``args`` are only formatted in when it is shown."""
+    LOG.log(DETAIL, msg, *args, extra=log_fields(fields))
 
-def check_for_update():
-    """Check for a newer version of this script via npm and GitHub."""
+def log_info(msg: str, *args, **fields):
+    """Log an informational message in cyan."""
+    LOG.info(msg, *args, extra=log_fields(fields))
+
+def log_success(msg: str, *args, **fields):
+    """Log a success message in green."""
+    LOG.log(SUCCESS, msg, *args, extra=log_fields(fields))
+
+def log_error(msg: str, *args, **fields):
+    """Log an error message in red."""
+    LOG.error(msg, *args, extra=log_fields(fields))
+
+def log_dryrun(msg: str, *args, **fields):
+    """Log a change that --dry-run did not apply."""
+    extra = {'kind': 'dryrun', **(log_fields(fields) or {})}
+    LOG.info(msg, *args, extra=extra)
+
+def init_colors():
+    """Enable colored output, importing colorama only when it is needed."""
+    global GREEN, RED, CYAN, YELLOW, RESET
+    try:
+        from colorama import init, Fore, Style
+    except ImportError:  # pragma: no cover - optional dependency
+        return
+    # Color output for Windows
+    init()
+    GREEN = Fore.GREEN
+    RED = Fore.RED
+    CYAN = Fore.CYAN
+    YELLOW = Fore.YELLOW
+    RESET = Style.RESET_ALL
+
+def update_check_cache_path():
+    """Return the file caching the latest published version."""
+    base = os.getenv('XDG_CACHE_HOME') or os.getenv('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'cloudflare-update-ip', 'update-check.json')
+
+def fetch_remote_version():
+    """Ask npm, then GitHub releases, for the latest published version."""
     npm_url = "https://registry.npmjs.org/@keeftraum/cloudflare-update-ip/latest"
     github_url = "https://api.github.com/repos/SkyLostTR/Cloudflare-Update-IP/releases/latest"
     remote_version = None
     # Try npm first
     try:
-        resp = requests.get(npm_url, timeout=8)
+        resp = get_client().request('GET', npm_url, authenticated=False, retries=0, timeout=UPDATE_CHECK_TIMEOUT)
         if resp.ok:
             data = resp.json()
             remote_version = data.get("version")
@@ -90,7 +271,7 @@ def check_for_update():
     # Fallback to GitHub releases
     if not remote_version:
         try:
-            resp = requests.get(github_url, timeout=8)
+            resp = get_client().request('GET', github_url, authenticated=False, retries=0, timeout=UPDATE_CHECK_TIMEOUT)
             if resp.ok:
                 data = resp.json()
                 remote_version = data.get("tag_name") or data.get("name")
@@ -98,42 +279,66 @@ def check_for_update():
                     remote_version = remote_version[1:]
         except Exception:
             pass
+    return remote_version
+
+def check_for_update(prompt=True):
+    """Check for a newer version of this script via npm and GitHub.
+
+    The answer is cached for UPDATE_CHECK_TTL seconds, a failed lookup for
+    UPDATE_CHECK_FAILURE_TTL seconds, and the update prompt is only shown
+    with ``prompt`` and when stdin is a terminal.
+    """
+    cache_path = update_check_cache_path()
+    cached = None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        ttl = UPDATE_CHECK_TTL if cached.get('version') else UPDATE_CHECK_FAILURE_TTL
+        if time.time() - cached.get('checked_at', 0) >= ttl:
+            cached = None
+    except (OSError, ValueError, AttributeError):
+        cached = None
+    if cached is not None:
+        remote_version = cached.get('version')
+        if not remote_version:
+            if DEBUG:
+                debug("[UPDATE] Skipping the update check, the last one failed less than an hour ago")
+            return
+    else:
+        remote_version = fetch_remote_version()
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'checked_at': time.time(), 'version': remote_version}, f)
+        except OSError:
+            pass
     if not remote_version:
         log_error("Failed to determine remote version for update check (npm & GitHub). Proceeding anyway.")
         return
     if remote_version != __version__:
-        print(f"A new version ({remote_version}) is available. You have {__version__}.")
+        log_info(f"A new version ({remote_version}) is available. You have {__version__}.")
+        if not prompt or not sys.stdin.isatty():
+            log_info("To update, run: npm i -g @keeftraum/cloudflare-update-ip or pull the latest from GitHub.")
+            return
         choice = input("Update now? (y/N): ").strip().lower()
         if choice in ("y", "yes"):
-            print("To update, run: npm i -g @keeftraum/cloudflare-update-ip or pull the latest from GitHub.")
+            log_info("To update, run: npm i -g @keeftraum/cloudflare-update-ip or pull the latest from GitHub.")
             sys.exit(0)
     else:
         log_info(f"You are running the latest version ({__version__}).")
 
-def init_env():
-    """Load environment variables from .env or ask interactively."""
-    global CLOUDFLARE_API_TOKEN, NEW_IP, OLD_IP, TARGET_DOMAIN, DRY_RUN, DEBUG, CENSOR, INTERACTIVE_ENV, HEADERS
-    # Try to load .env, if not found or missing required, prompt interactively
-    try:
-        dotenv_exists = False
-        try:
-            import importlib
-            dotenv_spec = importlib.util.find_spec('dotenv')
-            if dotenv_spec is not None:
-                dotenv_module = importlib.util.module_from_spec(dotenv_spec)
-                dotenv_spec.loader.exec_module(dotenv_module)
-                if hasattr(dotenv_module, 'find_dotenv'):
-                    dotenv_path = dotenv_module.find_dotenv()
-                    dotenv_exists = os.path.exists(dotenv_path) if dotenv_path else False
-        except Exception:
-            dotenv_exists = False
-        if not dotenv_exists:
-            for fname in ['.env', '.env.local', '.env.example']:
-                if os.path.exists(fname):
-                    dotenv_exists = True
-                    break
-    except Exception:
-        dotenv_exists = False
+def init_env(require_new_ip=True, interactive=True):
+    """Load environment variables from .env or ask interactively.
+
+    ``require_new_ip`` is False in watch mode, where NEW_IP is discovered at
+    runtime. With ``interactive=False`` missing variables are fatal instead of
+    being prompted for.
+    """
+    global CLOUDFLARE_API_TOKEN, NEW_IP, NEW_IPV6, OLD_IP, IP_MAP, TARGET_DOMAIN, DRY_RUN, DEBUG, CENSOR, INTERACTIVE_ENV, HEADERS
+    # The .env file was already located and loaded at import; prompt if it is missing
+    dotenv_exists = bool(DOTENV_PATH) and os.path.exists(DOTENV_PATH)
+    if not dotenv_exists:
+        dotenv_exists = any(os.path.exists(fname) for fname in ['.env', '.env.local', '.env.example'])
 
     def get_env(var: str, required: bool = True) -> Optional[str]:
         val = os.getenv(var)
@@ -142,7 +347,7 @@ def init_env():
             sys.exit(1)
         return val
 
-    if not dotenv_exists or not os.getenv('CLOUDFLARE_API_TOKEN') or not os.getenv('NEW_IP'):
+    if interactive and (not dotenv_exists or not os.getenv('CLOUDFLARE_API_TOKEN') or (require_new_ip and not os.getenv('NEW_IP'))):
         INTERACTIVE_ENV = True
         env = prompt_for_env()
         CLOUDFLARE_API_TOKEN = env['CLOUDFLARE_API_TOKEN']
@@ -155,29 +360,32 @@ def init_env():
     else:
         INTERACTIVE_ENV = False
         CLOUDFLARE_API_TOKEN = get_env('CLOUDFLARE_API_TOKEN')
-        NEW_IP = get_env('NEW_IP')
+        NEW_IP = get_env('NEW_IP', required=require_new_ip)
         OLD_IP = os.getenv('OLD_IP')
         TARGET_DOMAIN = os.getenv('TARGET_DOMAIN')
         DRY_RUN = os.getenv('DRY_RUN', '0').lower() in ('1', 'true')
         DEBUG = os.getenv('DEBUG', '0').lower() in ('1', 'true')
         CENSOR = os.getenv('CENSOR', '1').lower() in ('1', 'true', 'yes')
+    IP_MAP = os.getenv('IP_MAP')
+    NEW_IPV6 = os.getenv('NEW_IPV6')
     HEADERS = {
         'Authorization': f'Bearer {CLOUDFLARE_API_TOKEN}',
         'Content-Type': 'application/json',
     }
 
-def debug(msg: str):
-    """Write debug messages to a file when DEBUG is enabled."""
+def debug(msg: str, *args):
+    """Write debug messages to the log file when DEBUG is enabled."""
     if DEBUG:
-        with open('debug_output.txt', 'a', encoding='utf-8') as f:
-            f.write(msg + '\n')
+        LOG.debug(msg, *args)
 
 def print_banner():
     text = "Cloudflare Batch Tool"
-    if figlet_format:
-        banner = figlet_format(text)
-    else:
+    try:
+        from pyfiglet import figlet_format
+    except ImportError:  # pragma: no cover - optional dependency
         banner = text
+    else:
+        banner = figlet_format(text)
     print(f"{CYAN}{banner}{RESET}")
     print(f"{YELLOW}(credit: @SkyLostTR/@Keeftraum){RESET}")
 
@@ -206,7 +414,7 @@ def censor_env(env_dict):
     """Return a copy of env dict with sensitive fields masked."""
     CENSOR_KEYS = [
         'CLOUDFLARE_API_TOKEN', 'CLOUDFLARE_AUTH_KEY', 'CLOUDFLARE_AUTH_EMAIL',
-        'NEW_IP', 'OLD_IP', 'TARGET_DOMAIN'
+        'NEW_IP', 'NEW_IPV6', 'OLD_IP', 'IP_MAP', 'TARGET_DOMAIN'
     ]
     censored = {}
     for k, v in env_dict.items():
@@ -231,14 +439,14 @@ def print_censored_env():
         print("\nENVIRONMENT (uncensored):")
         env_vars = [
             'CLOUDFLARE_API_TOKEN', 'CLOUDFLARE_AUTH_KEY', 'CLOUDFLARE_AUTH_EMAIL',
-            'NEW_IP', 'OLD_IP', 'TARGET_DOMAIN', 'DRY_RUN', 'DEBUG'
+            'NEW_IP', 'NEW_IPV6', 'OLD_IP', 'IP_MAP', 'TARGET_DOMAIN', 'DRY_RUN', 'DEBUG'
         ]
         for k in env_vars:
             print(f"  {k} = {os.getenv(k)}")
         return
     env_vars = [
         'CLOUDFLARE_API_TOKEN', 'CLOUDFLARE_AUTH_KEY', 'CLOUDFLARE_AUTH_EMAIL',
-        'NEW_IP', 'OLD_IP', 'TARGET_DOMAIN', 'DRY_RUN', 'DEBUG'
+        'NEW_IP', 'NEW_IPV6', 'OLD_IP', 'IP_MAP', 'TARGET_DOMAIN', 'DRY_RUN', 'DEBUG'
     ]
     env_dict = {k: os.getenv(k) for k in env_vars}
     censored = censor_env(env_dict)
@@ -246,28 +454,816 @@ def print_censored_env():
     for k, v in censored.items():
         print(f"  {k} = {v}")
 
-def get_zones():
-    """Fetch all accessible zones or filter by TARGET_DOMAIN."""
-    url = 'https://api.cloudflare.com/client/v4/zones/?per_page=500'
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    zones = resp.json()['result']
-    if TARGET_DOMAIN:
-        zones = [z for z in zones if z['name'] == TARGET_DOMAIN]
+class RunMetrics:
+    """Thread-safe request and phase statistics for one process.
+
+    API calls are attributed to the phase active on the calling thread or
+    asyncio task (zone_listing, record_fetch, match, write, backup, restore).
+    Phase times are summed across workers.
+    """
+
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # A context variable is private to each thread and to each asyncio task
+        self.active_phase = contextvars.ContextVar('phase', default=None)
+        self.phase_seconds = defaultdict(float)
+        self.requests = defaultdict(int)
+        self.latency = {}
+        self.counters = defaultdict(float)
+
+    @property
+    def current_phase(self):
+        return self.active_phase.get() or 'other'
+
+    @contextmanager
+    def phase(self, name, timed=True):
+        """Attribute work on this thread or task to ``name``; ``timed=False`` only attributes requests."""
+        token = self.active_phase.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active_phase.reset(token)
+            if timed:
+                with self.lock:
+                    self.phase_seconds[name] += time.perf_counter() - start
+
+    def observe_request(self, method, status, elapsed, sent=0, received=0):
+        phase = self.current_phase
+        with self.lock:
+            self.requests[(phase, method.upper(), str(status))] += 1
+            hist = self.latency.setdefault(phase, {'buckets': [0] * len(self.LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += elapsed
+            hist['count'] += 1
+            self.counters['bytes_sent'] += sent
+            self.counters['bytes_received'] += received
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def summary(self):
+        """Return the collected metrics as a JSON-serialisable dict."""
+        with self.lock:
+            return {
+                'phases': {name: round(secs, 6) for name, secs in self.phase_seconds.items()},
+                'requests': [
+                    {'phase': phase, 'method': method, 'status': status, 'count': count}
+                    for (phase, method, status), count in sorted(self.requests.items())
+                ],
+                'request_latency_seconds': {
+                    phase: {
+                        'buckets': dict(zip([str(b) for b in self.LATENCY_BUCKETS], hist['buckets'])),
+                        'sum': round(hist['sum'], 6),
+                        'count': hist['count'],
+                    }
+                    for phase, hist in self.latency.items()
+                },
+                'counters': dict(self.counters),
+            }
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        data = self.summary()
+        lines = [
+            '# HELP cfupdate_phase_seconds Time spent in each phase, summed across workers.',
+            '# TYPE cfupdate_phase_seconds gauge',
+        ]
+        lines += [f'cfupdate_phase_seconds{{phase="{p}"}} {v}' for p, v in sorted(data['phases'].items())]
+        lines += [
+            '# HELP cfupdate_requests_total Cloudflare API requests by phase, method and status.',
+            '# TYPE cfupdate_requests_total counter',
+        ]
+        lines += [
+            f'cfupdate_requests_total{{phase="{r["phase"]}",method="{r["method"]}",status="{r["status"]}"}} {r["count"]}'
+            for r in data['requests']
+        ]
+        lines += [
+            '# HELP cfupdate_request_duration_seconds Cloudflare API request latency by phase.',
+            '# TYPE cfupdate_request_duration_seconds histogram',
+        ]
+        for phase, hist in sorted(data['request_latency_seconds'].items()):
+            for bound, count in hist['buckets'].items():
+                lines.append(f'cfupdate_request_duration_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+            lines.append(f'cfupdate_request_duration_seconds_bucket{{phase="{phase}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'cfupdate_request_duration_seconds_sum{{phase="{phase}"}} {hist["sum"]}')
+            lines.append(f'cfupdate_request_duration_seconds_count{{phase="{phase}"}} {hist["count"]}')
+        for name, value in sorted(data['counters'].items()):
+            lines.append(f'# TYPE cfupdate_{name} gauge')
+            lines.append(f'cfupdate_{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write a Prometheus textfile for ``.prom`` paths, JSON otherwise."""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=2)
+        os.replace(tmp_path, path)
+
+METRICS = RunMetrics()
+
+class RateLimiter:
+    """Thread-safe token bucket shared by every Cloudflare API call."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(self.rate * 10)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token if one is available; otherwise return the seconds to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until a request may be sent."""
+        import asyncio
+        wait = self.reserve()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.reserve()
+
+    def pause(self, seconds):
+        """Hold back every caller for ``seconds``, e.g. after a 429 response."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+def retry_after_seconds(resp, default=1.0):
+    """Return the delay requested by a ``Retry-After`` header."""
+    try:
+        return max(0.0, float(resp.headers.get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default
+
+class CloudflareClient:
+    """Keep-alive HTTP session with pooling, timeouts and retries for all API calls."""
+
+    # Methods that are safe to resend after a timeout or 5xx response
+    IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+    def __init__(self, headers=None, rate_limiter=None, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, backoff=0.5, max_backoff=30.0):
+        # None means "use the module-level HEADERS set by init_env()"
+        self.headers = headers
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def retry_delay(self, method, url, attempt, resp=None, error=None, limiter=None):
+        """Return the seconds to wait before resending a request, or None to stop.
+
+        Shared by both engines: ``resp`` is the response received, or
+        ``error`` the network error raised instead. 429s are always retried,
+        5xx responses and network errors only for idempotent methods. A 429
+        pauses the ``limiter`` for every worker, whose next acquire waits.
+        """
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        if error is not None:
+            if not idempotent:
+                return None
+            delay = self.backoff_delay(attempt)
+            log_info(f"Request to Cloudflare failed ({error.__class__.__name__}), retrying in {delay:.1f}s")
+            return delay
+        if resp.status_code == 429:
+            METRICS.count('rate_limited')
+            delay = retry_after_seconds(resp, self.backoff_delay(attempt))
+            log_info(f"Rate limited by Cloudflare, backing off for {delay:g}s")
+            if limiter:
+                # Hold back every worker, not just this one
+                limiter.pause(delay)
+                return 0.0
+            return delay
+        if resp.status_code >= 500 and idempotent:
+            delay = self.backoff_delay(attempt)
+            if DEBUG:
+                debug(f"[RETRY] {method} {url} returned {resp.status_code}, retrying in {delay:.1f}s")
+            return delay
+        return None
+
+    def request(self, method, url, authenticated=True, retries=None, **kwargs):
+        """Send a request, retrying 429s and (for idempotent methods) 5xx and network errors.
+
+        Only ``authenticated`` requests carry the API token and count against the
+        rate limiter, so third-party URLs never see Cloudflare credentials.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        headers = (self.headers if self.headers is not None else HEADERS) if authenticated else None
+        limiter = self.rate_limiter if authenticated else None
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            if attempt:
+                METRICS.count('retries')
+            if limiter:
+                waited = time.perf_counter()
+                limiter.acquire()
+                METRICS.count('rate_limit_wait_seconds', time.perf_counter() - waited)
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                METRICS.observe_request(method, 'error', time.perf_counter() - start)
+                delay = None if last else self.retry_delay(method, url, attempt, error=e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            METRICS.observe_request(method, resp.status_code, time.perf_counter() - start,
+                                    len(resp.request.body or b''), len(resp.content))
+            delay = None if last else self.retry_delay(method, url, attempt, resp, limiter=limiter)
+            if delay is None:
+                return resp
+            time.sleep(delay)
+        return resp
+
+def get_client():
+    """Return the shared API client, creating a default one on first use."""
+    global CLIENT
+    if CLIENT is None:
+        CLIENT = CloudflareClient(rate_limiter=RateLimiter(DEFAULT_RATE_LIMIT))
+    return CLIENT
+
+class Record:
+    """Compact DNS record holding only the fields needed to match and update it.
+
+    Passed as the ``object_hook`` when a page of records is parsed, so meta,
+    settings, tags and the other unused fields are dropped as soon as each
+    record is decoded. Reads like the dict it replaces: ``rec['content']``
+    and ``rec.get('ttl', 3600)`` both work.
+    """
+
+    __slots__ = ('id', 'type', 'name', 'content', 'ttl', 'proxied', 'modified_on')
+
+    def __init__(self, id, type, name, content, ttl=None, proxied=None, modified_on=None):
+        self.id = id
+        self.type = type
+        self.name = name
+        self.content = content
+        self.ttl = ttl
+        self.proxied = proxied
+        self.modified_on = modified_on
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*(data.get(field) for field in cls.__slots__))
+
+    @classmethod
+    def json_hook(cls, obj):
+        """``json.loads`` object hook turning record objects into Records and leaving the rest alone."""
+        if 'id' in obj and 'type' in obj and 'content' in obj:
+            return cls.from_dict(obj)
+        return obj
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return f'Record({self.to_dict()!r})'
+
+def paginate(url, params=None, per_page=500, object_hook=None):
+    """Yield every result of a paginated Cloudflare list endpoint.
+
+    The next page is fetched in the background while the caller works through
+    the current one, so at most two pages are held in memory at a time.
+    ``object_hook`` is handed to the JSON decoder, e.g. Record.json_hook.
+    """
+    params = dict(params or {})
+    params['per_page'] = per_page
+    phase = METRICS.current_phase
+
+    def fetch(page):
+        # Prefetched pages count towards the phase of the consuming thread
+        with METRICS.phase(phase, timed=False):
+            resp = get_client().request('GET', url, params={**params, 'page': page})
+        resp.raise_for_status()
+        return resp.json(object_hook=object_hook)
+
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        page = 1
+        payload = fetch(page)
+        while True:
+            total_pages = (payload.get('result_info') or {}).get('total_pages') or 1
+            pending = prefetch.submit(fetch, page + 1) if page < total_pages else None
+            yield from payload.get('result') or []
+            if pending is None:
+                return
+            payload = pending.result()
+            page += 1
+
+class ZoneFilter:
+    """Select zones by exact name, glob (``*.example.com``) or ``re:`` regular expression.
+
+    Exact names and globs with a single leading and/or trailing ``*`` can be
+    sent to the API as ``name`` filters. Every zone is still checked locally,
+    so patterns the API cannot express simply cost a full listing.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = [p.strip() for p in patterns if p and p.strip()]
+        self.regexes = [re.compile(p[3:], re.IGNORECASE) for p in self.patterns if p.startswith('re:')]
+        self.globs = [p.lower() for p in self.patterns if not p.startswith('re:')]
+
+    @classmethod
+    def parse(cls, text):
+        """Build a filter from a comma-separated list, or return None to select every zone."""
+        patterns = [p for p in (text or '').split(',') if p.strip()]
+        return cls(patterns) if patterns else None
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    @property
+    def key(self):
+        return ','.join(sorted(self.patterns))
+
+    def matches(self, zone_name):
+        name = zone_name.lower()
+        return any(fnmatch.fnmatchcase(name, g) for g in self.globs) or any(r.search(zone_name) for r in self.regexes)
+
+    def queries(self):
+        """Return the ``name`` filters for the zones endpoint, or None if every zone has to be listed."""
+        queries = []
+        for glob in self.globs:
+            core = glob.strip('*')
+            if not core or any(c in core for c in '*?['):
+                return None
+            if glob.startswith('*') and glob.endswith('*'):
+                queries.append({'name': f'contains:{core}'})
+            elif glob.startswith('*'):
+                queries.append({'name': f'ends_with:{core}'})
+            elif glob.endswith('*'):
+                queries.append({'name': f'starts_with:{core}'})
+            else:
+                queries.append({'name': core})
+        return None if self.regexes else queries
+
+def unique_by_id(items):
+    """Yield items in order, dropping repeats returned by overlapping queries."""
+    seen = set()
+    for item in items:
+        if item['id'] not in seen:
+            seen.add(item['id'])
+            yield item
+
+def get_zones(zone_filter=None):
+    """Lazily yield the accessible zones selected by ``zone_filter``.
+
+    ``zone_filter`` defaults to the zones named in TARGET_DOMAIN.
+    """
+    if zone_filter is None:
+        zone_filter = ZoneFilter.parse(TARGET_DOMAIN)
+    queries = zone_filter.queries() if zone_filter else None
+    # The zones endpoint caps per_page at 50
+    if queries is None:
+        zones = paginate(f'{API_BASE}/zones', per_page=50)
+    else:
+        zones = unique_by_id(z for query in queries for z in paginate(f'{API_BASE}/zones', query, per_page=50))
+    if zone_filter:
+        return (z for z in zones if zone_filter.matches(z['name']))
     return zones
 
-def get_records(zone_id, record_type=None):
-    """Return DNS records for the given zone."""
-    url = f'https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records?per_page=500'
+def get_records(zone_id, record_type=None, filters=None, compact=False):
+    """Lazily yield DNS records for the given zone across all result pages.
+
+    ``filters`` are extra list parameters such as ``content.contains`` or
+    ``name.contains``. With ``compact`` the records are yielded as Record
+    objects instead of the full API payload.
+    """
+    params = dict(filters or {})
     if record_type:
-        url += f'&type={record_type}'
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-    return resp.json()['result']
+        params['type'] = record_type
+    return paginate(f'{API_BASE}/zones/{zone_id}/dns_records', params,
+                    object_hook=Record.json_hook if compact else None)
 
-def update_generic_record(zone_id, record, new_content):
-    """Update a DNS record with new content."""
-    url = f'https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{record["id"]}'
+def group_records_by_type(records, record_types=None):
+    """Sort records into a ``{type: [records]}`` dict, keeping only ``record_types`` if given."""
+    grouped = {}
+    for rec in records:
+        rtype = rec.get('type')
+        if record_types is not None and rtype not in record_types:
+            continue
+        grouped.setdefault(rtype, []).append(rec)
+    return grouped
+
+def skip_dns_name(data, offset):
+    """Return the offset just past the (possibly compressed) DNS name at ``offset``."""
+    while True:
+        length = data[offset]
+        if length & 0xc0 == 0xc0:
+            return offset + 2
+        offset += length + 1
+        if length == 0:
+            return offset
+
+def parse_soa_serial(response, query_id):
+    """Return the serial of the SOA record answering query ``query_id``."""
+    rid, flags, qdcount, ancount = struct.unpack_from('!HHHH', response)
+    if rid != query_id or flags & 0x000f:
+        raise ValueError(f"SOA query failed (rcode {flags & 0x000f})")
+    offset = 12
+    for _ in range(qdcount):
+        offset = skip_dns_name(response, offset) + 4
+    for _ in range(ancount):
+        offset = skip_dns_name(response, offset)
+        rtype, _, _, rdlength = struct.unpack_from('!HHIH', response, offset)
+        offset += 10
+        if rtype == 6:
+            # SOA data is MNAME, RNAME, then the serial
+            return struct.unpack_from('!I', response, skip_dns_name(response, skip_dns_name(response, offset)))[0]
+        offset += rdlength
+    raise ValueError("no SOA record in the answer")
+
+def zone_serial(zone):
+    """Return the SOA serial served by the zone's Cloudflare name servers, or None if none answers.
+
+    Cloudflare increments the serial whenever a record of the zone changes,
+    so one UDP query tells whether cached records are still current without
+    spending an API request.
+    """
+    qname = b''.join(bytes([len(label)]) + label.encode('idna') for label in zone['name'].rstrip('.').split('.')) + b'\0'
+    query_id = random.randrange(0x10000)
+    query = struct.pack('!HHHHHH', query_id, 0, 1, 0, 0, 0) + qname + struct.pack('!HH', 6, 1)
+    for server in zone.get('name_servers') or []:
+        try:
+            family, socktype, proto, _, address = socket.getaddrinfo(server, DNS_PORT, type=socket.SOCK_DGRAM)[0]
+            with socket.socket(family, socktype, proto) as sock:
+                sock.settimeout(DNS_TIMEOUT)
+                sock.sendto(query, address)
+                return parse_soa_serial(sock.recv(4096), query_id)
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            if DEBUG:
+                debug(f"[CACHE] SOA query for {zone['name']} to {server} failed: {e}")
+    return None
+
+class RecordCache:
+    """On-disk JSON cache of each zone's DNS records.
+
+    Entries are keyed by zone id and reused while they are younger than
+    ``ttl`` seconds and the zone's SOA serial, checked live on every run,
+    is the one seen when the records were fetched. A zone whose serial
+    cannot be read is always fetched again.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = {'records': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data['records'] = json.load(f).get('records', {})
+            except (OSError, ValueError, AttributeError) as e:
+                log_error(f"Ignoring unreadable cache file {path}: {e}")
+
+    def is_fresh(self, entry):
+        return bool(entry) and time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    def cached_records(self, zone, serial):
+        """Return the cached records of ``zone``, or None unless they were fetched at SOA ``serial``."""
+        if serial is None:
+            return None
+        with self.lock:
+            entry = self.data['records'].get(zone['id'])
+            if self.is_fresh(entry) and entry.get('serial') == serial:
+                if DEBUG:
+                    debug(f"[CACHE] Using cached records for zone {zone['id']} (serial {serial})")
+                return [Record.from_dict(rec) for rec in entry['records'].values()]
+        return None
+
+    def store_records(self, zone, records, serial):
+        """Remember ``records`` as the content of ``zone`` at SOA ``serial``."""
+        with self.lock:
+            if serial is None:
+                self.data['records'].pop(zone['id'], None)
+                return
+            self.data['records'][zone['id']] = {
+                'fetched_at': time.time(),
+                'serial': serial,
+                'records': {rec['id']: rec.to_dict() for rec in records},
+            }
+
+    def save(self):
+        """Atomically write the cache back to disk."""
+        tmp_path = f'{self.path}.tmp'
+        with self.lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+def fetch_zone_records(zone):
+    """Return the records of ``zone`` that the update may change, as compact Records.
+
+    RECORD_CACHE keeps whole zones, so with the cache enabled every record
+    is fetched. Otherwise only the records matching record_queries() are
+    requested.
+    """
+    if RECORD_CACHE:
+        # The serial is read before the records so a change in between is
+        # picked up on the next run
+        serial = zone_serial(zone)
+        records = RECORD_CACHE.cached_records(zone, serial)
+        if records is None or zone_has_changes(zone, records):
+            records = list(get_records(zone['id'], compact=True))
+            RECORD_CACHE.store_records(zone, records, serial)
+        return records
+    queries = record_queries(zone)
+    if queries is None:
+        return get_records(zone['id'], compact=True)
+    return unique_by_id(rec for query in queries for rec in get_records(zone['id'], filters=query, compact=True))
+
+class IPMatcher:
+    """Replace any number of old IP addresses with new ones in a single pass.
+
+    All old addresses are compiled into one regular expression whose
+    boundaries stop ``1.2.3.4`` from matching inside ``11.2.3.45``. IPv6
+    addresses match in compressed, zero-stripped and exploded notation, and
+    records whose whole content is one of those spellings are looked up
+    directly.
+    """
+
+    def __init__(self, mappings):
+        self.mapping = {}
+        # Every spelling of an old address -> its new address
+        self.exact = {}
+        v4, v6 = set(), set()
+        for old, new in mappings.items():
+            old_addr = ipaddress.ip_address(old.strip())
+            new_addr = ipaddress.ip_address(new.strip())
+            if old_addr.version != new_addr.version:
+                raise ValueError(f"cannot map IPv{old_addr.version} address {old_addr} "
+                                 f"to IPv{new_addr.version} address {new_addr}")
+            self.mapping[old_addr] = str(new_addr)
+            if old_addr.version == 4:
+                spellings = {str(old_addr)}
+                v4.update(spellings)
+            else:
+                groups = old_addr.exploded.split(':')
+                spellings = {old_addr.compressed, old_addr.exploded, ':'.join(f'{int(g, 16):x}' for g in groups)}
+                v6.update(spellings)
+            self.exact.update(dict.fromkeys(spellings, str(new_addr)))
+        alternatives = []
+        if v4:
+            alternatives.append(r'(?<![\w.])(?:%s)(?![\w]|\.\d)' % self._union(v4))
+        if v6:
+            # "ip6:" is the only colon-terminated prefix allowed before an IPv6 address
+            alternatives.append(r'(?:(?<=ip6:)|(?<![\w.:]))(?:%s)(?![\w:]|\.\d)' % self._union(v6))
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        # Without the boundary lookarounds this scans several times faster, and
+        # most records contain no old address at all
+        self.prefilter = re.compile(self._union(v4 | v6), re.IGNORECASE) if alternatives else None
+
+    @staticmethod
+    def _union(addresses):
+        # Longest first so a shorter address never shadows a longer one
+        return '|'.join(re.escape(a) for a in sorted(addresses, key=len, reverse=True))
+
+    def _swap(self, match):
+        return self.mapping[ipaddress.ip_address(match.group(0))]
+
+    def replace(self, content):
+        """Return ``content`` with every mapped address replaced."""
+        if self.pattern is None or not content:
+            return content
+        new = self.exact.get(content)
+        if new is not None:
+            return new
+        if not self.prefilter.search(content):
+            return content
+        return self.pattern.sub(self._swap, content)
+
+def parse_ip_map(text):
+    """Parse ``old=new,old2=new2`` into a dict."""
+    mappings = {}
+    for pair in (text or '').split(','):
+        if pair.strip():
+            old, sep, new = pair.partition('=')
+            if not sep:
+                raise ValueError(f"Invalid IP_MAP entry '{pair}', expected old=new")
+            mappings[old.strip()] = new.strip()
+    return mappings
+
+def default_mappings():
+    """Return OLD_IP (comma-separated) -> NEW_IP plus the IP_MAP pairs.
+
+    Old IPv6 addresses map to NEW_IPV6, which they require.
+    """
+    mappings = {}
+    for old in (OLD_IP or '').split(','):
+        if not old.strip():
+            continue
+        if ':' in old and not NEW_IPV6:
+            raise ValueError(f"OLD_IP {old.strip()} is an IPv6 address, set NEW_IPV6 to replace it")
+        new = NEW_IPV6 if ':' in old else NEW_IP
+        if new:
+            mappings[old.strip()] = new
+    mappings.update(parse_ip_map(IP_MAP))
+    return mappings
+
+class UpdateJob:
+    """One set of replacements: which zones, which record types and which addresses.
+
+    ``zones`` holds zone names, glob patterns or ``re:`` expressions (all
+    zones when empty), and ``name_contains`` optionally limits the records
+    by name. A records are set to ``new_ip`` and AAAA records to
+    ``new_ipv6`` when given; every other selected record has the
+    ``mappings`` applied through an IPMatcher.
+    """
+
+    # Record types holding encoded key, hash or location data, which never contain an address
+    OPAQUE_TYPES = frozenset({'CERT', 'DNSKEY', 'DS', 'LOC', 'SMIMEA', 'SSHFP', 'TLSA'})
+
+    def __init__(self, name='default', zones=None, new_ip=None, mappings=None, record_types=None, name_contains=None,
+                 new_ipv6=None):
+        self.name = name
+        self.zone_filter = ZoneFilter(zones or [])
+        self.name_contains = name_contains.lower() if name_contains else None
+        self.new_ip = self._address(new_ip, 4, 'new_ip')
+        self.new_ipv6 = self._address(new_ipv6, 6, 'new_ipv6')
+        try:
+            self.matcher = IPMatcher(mappings or {})
+        except ValueError as e:
+            raise ValueError(f"invalid mappings in job '{name}': {e}") from None
+        unknown = set(record_types or []) - set(RECORD_TYPES)
+        if unknown:
+            raise ValueError(f"unsupported record type(s) {', '.join(sorted(unknown))} in job '{name}'")
+        self.record_types = set(record_types or RECORD_TYPES)
+
+    def _address(self, value, version, key):
+        if not value:
+            return None
+        try:
+            addr = ipaddress.ip_address(value.strip())
+        except ValueError:
+            raise ValueError(f"{key} of job '{self.name}' is not a valid IP address: {value}") from None
+        if addr.version != version:
+            raise ValueError(f"{key} of job '{self.name}' must be an IPv{version} address, got {value}")
+        return str(addr)
+
+    def matches_zone(self, zone_name):
+        return not self.zone_filter or self.zone_filter.matches(zone_name)
+
+    def candidate_types(self):
+        """Return the selected record types whose content this job can change.
+
+        A records only hold IPv4 and AAAA records only IPv6 addresses, so
+        without old addresses to replace only the A/AAAA types set by
+        ``new_ip``/``new_ipv6`` remain.
+        """
+        types = set()
+        if self.new_ip:
+            types.add('A')
+        if self.new_ipv6:
+            types.add('AAAA')
+        versions = {addr.version for addr in self.matcher.mapping}
+        text_types = set(RECORD_TYPES) - self.OPAQUE_TYPES - {'A', 'AAAA'}
+        if 4 in versions:
+            types |= text_types | {'A'}
+        if 6 in versions:
+            types |= text_types | {'AAAA'}
+        return types & self.record_types
+
+    def apply(self, record_type, content, record_name=None):
+        """Return ``content`` as this job would rewrite it."""
+        if record_type not in self.record_types:
+            return content
+        if self.name_contains and self.name_contains not in (record_name or '').lower():
+            return content
+        if record_type == 'A' and self.new_ip:
+            return self.new_ip
+        if record_type == 'AAAA' and self.new_ipv6:
+            return self.new_ipv6
+        return self.matcher.replace(content)
+
+def build_default_job():
+    """Build the job described by the environment (NEW_IP, NEW_IPV6, OLD_IP, IP_MAP, TARGET_DOMAIN)."""
+    return UpdateJob(zones=(TARGET_DOMAIN or '').split(','), new_ip=NEW_IP, mappings=default_mappings(),
+                     new_ipv6=NEW_IPV6)
+
+# Fields of a job file entry: string fields, and those that also take a list of strings
+JOB_STRING_FIELDS = ('name', 'new_ip', 'new_ipv6', 'old_ip', 'name_contains')
+JOB_LIST_FIELDS = ('zones', 'record_types')
+
+def check_job_entry(entry, name):
+    """Raise ValueError unless the job file ``entry`` only has known fields of the right types."""
+    unknown = set(entry) - set(JOB_STRING_FIELDS) - set(JOB_LIST_FIELDS) - {'mappings'}
+    if unknown:
+        raise ValueError(f"job '{name}' has unknown field(s) {', '.join(sorted(map(str, unknown)))}")
+    for key in JOB_STRING_FIELDS:
+        if entry.get(key) is not None and not isinstance(entry[key], str):
+            raise ValueError(f"{key} of job '{name}' must be a string")
+    for key in JOB_LIST_FIELDS:
+        value = entry.get(key)
+        if value is not None and not isinstance(value, str) and not (
+                isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f"{key} of job '{name}' must be a string or a list of strings")
+    mappings = entry.get('mappings')
+    if mappings is not None and not (isinstance(mappings, dict) and all(
+            isinstance(k, str) and isinstance(v, str) for k, v in mappings.items())):
+        raise ValueError(f"mappings of job '{name}' must map old to new addresses as strings")
+
+def load_jobs(path):
+    """Read a list of jobs from a JSON file, or from YAML when PyYAML is installed.
+
+    Each entry may contain ``name``, ``zones``, ``new_ip``, ``new_ipv6``,
+    ``old_ip``, ``mappings`` (``{old: new}``), ``record_types`` and
+    ``name_contains``. A malformed file raises ValueError.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:  # pragma: no cover - optional dependency
+                raise ValueError("PyYAML is required for YAML job files (pip install pyyaml)")
+            try:
+                entries = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"{path} is not valid YAML: {e}") from None
+        else:
+            try:
+                entries = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path} is not valid JSON: {e}") from None
+    if isinstance(entries, dict):
+        entries = entries.get('jobs')
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty list of jobs")
+    jobs = []
+    for i, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"job {i} in {path} must be a mapping of fields, got {type(entry).__name__}")
+        name = str(entry.get('name') or f'job{i}')
+        check_job_entry(entry, name)
+        mappings = dict(entry.get('mappings') or {})
+        if entry.get('old_ip'):
+            if not entry.get('new_ip') and not entry.get('new_ipv6'):
+                raise ValueError(f"job '{name}' sets old_ip without new_ip")
+            for old in str(entry['old_ip']).split(','):
+                if old.strip():
+                    # Old IPv6 addresses move to new_ipv6, old IPv4 addresses to new_ip
+                    new = entry.get('new_ipv6') if ':' in old else entry.get('new_ip')
+                    if not new:
+                        key = 'new_ipv6' if ':' in old else 'new_ip'
+                        raise ValueError(f"job '{name}' needs {key} for old_ip {old.strip()}")
+                    mappings[old.strip()] = new
+        zones = entry.get('zones')
+        if isinstance(zones, str):
+            zones = [zones]
+        record_types = entry.get('record_types')
+        if isinstance(record_types, str):
+            record_types = [t.strip() for t in record_types.split(',') if t.strip()]
+        jobs.append(UpdateJob(name, zones, entry.get('new_ip'), mappings, record_types,
+                              entry.get('name_contains'), entry.get('new_ipv6')))
+    return jobs
+
+def record_payload(record, new_content):
+    """Build the request body that sets ``record`` to ``new_content``."""
     data = {
         'type': record['type'],
         'name': record['name'],
@@ -278,59 +1274,745 @@ def update_generic_record(zone_id, record, new_content):
     # Remove proxied if not supported
     if data['proxied'] is None:
         data.pop('proxied')
-    resp = requests.put(url, headers=HEADERS, json=data)
+    return data
+
+def update_generic_record(zone_id, record, new_content):
+    """Update a DNS record with new content."""
+    return write_record(zone_id, {'id': record['id'], **record_payload(record, new_content)})
+
+def write_record(zone_id, body):
+    """Send a single write: PUT when ``body`` carries an ``id``, POST to create otherwise."""
+    body = dict(body)
+    rec_id = body.pop('id', None)
+    if rec_id:
+        resp = get_client().request('PUT', f'{API_BASE}/zones/{zone_id}/dns_records/{rec_id}', json=body)
+    else:
+        resp = get_client().request('POST', f'{API_BASE}/zones/{zone_id}/dns_records', json=body)
     return resp.ok, resp.text
 
-def backup_records(zones, backup_file='cf_backup.json'):
-    """Backup all DNS records for all zones to a JSON file."""
-    all_data = {}
-    for zone in zones:
-        zone_id = zone['id']
-        zone_name = zone['name']
+def batch_request(chunk):
+    """Return the ``dns_records/batch`` request body for ``(kind, body)`` writes."""
+    request = {'puts': [body for kind, body in chunk if kind == 'puts'],
+               'posts': [body for kind, body in chunk if kind == 'posts']}
+    return {k: v for k, v in request.items() if v}
+
+def batch_failed(zone_id, chunk, error):
+    """Report a batch that could not be sent and return a failed result for each of its writes."""
+    log_error(f"Batch of {len(chunk)} writes failed in zone {zone_id}: {error}")
+    return [(body, False, str(error)) for kind, body in chunk]
+
+def split_batch_result(zone_id, chunk, resp):
+    """Sort the ``(kind, body)`` writes of a sent batch by the response it got.
+
+    ``resp`` may come from either engine. Returns ``(results, fallback)``:
+    ``(body, ok, detail)`` for every write whose outcome is known, and the
+    writes to retry one at a time. Cloudflare applies a batch atomically, so
+    only a definite rejection (a 4xx other than 429 with ``success: false``)
+    is retried that way. After a 429 or 5xx the client's retries are used up
+    and the whole batch is reported as failed.
+    """
+    status = resp.status_code
+    try:
+        payload = resp.json()
+    except ValueError:
+        payload = None
+    payload = payload if isinstance(payload, dict) else {}
+    if not (200 <= status < 300 and payload.get('success')):
+        if 400 <= status < 500 and status != 429 and payload.get('success') is False:
+            if DEBUG:
+                debug(f"[BATCH] Batch of {len(chunk)} writes rejected in zone {zone_id}, "
+                      f"falling back to single writes: {resp.text}")
+            return [], list(chunk)
+        detail = str(payload.get('errors') or f'HTTP {status}')
+        return [(body, False, detail) for kind, body in chunk], []
+    result = payload.get('result') or {}
+    applied = {r.get('id') for r in result.get('puts') or []}
+    created = len(result.get('posts') or [])
+    results = []
+    fallback = []
+    for kind, body in chunk:
+        if kind == 'puts' and body['id'] in applied:
+            results.append((body, True, 'batch'))
+        elif kind == 'posts' and created:
+            created -= 1
+            results.append((body, True, 'batch'))
+        else:
+            fallback.append((kind, body))
+    if fallback and DEBUG:
+        debug(f"[BATCH] {len(fallback)} of {len(chunk)} batched writes in zone {zone_id} not applied, "
+              "falling back to single writes")
+    return results, fallback
+
+def batch_write_records(zone_id, puts=(), posts=(), batch_size=BATCH_SIZE):
+    """Send record writes through the ``dns_records/batch`` endpoint in chunks.
+
+    ``puts`` are full record bodies including their ``id``; ``posts`` are
+    records to create. Yields ``(body, ok, detail)`` for every write. The
+    writes of a rejected batch are retried one at a time with write_record();
+    a batch that failed for any other reason, including a network error that
+    leaves open whether it was applied, is reported as failed.
+    """
+    url = f'{API_BASE}/zones/{zone_id}/dns_records/batch'
+    operations = [('puts', body) for body in puts] + [('posts', body) for body in posts]
+    for start in range(0, len(operations), batch_size):
+        chunk = operations[start:start + batch_size]
         try:
-            resp = requests.get(f'https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records', headers=HEADERS)
-            resp.raise_for_status()
-            records = resp.json().get('result', [])
-            all_data[zone_name] = {
-                'zone_id': zone_id,
-                'records': records
-            }
-            log_success(f"Backed up {len(records)} records for zone {zone_name}")
-        except Exception as e:
-            log_error(f"Failed to backup zone {zone_name}: {e}")
-    with open(backup_file, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, indent=2)
+            resp = get_client().request('POST', url, json=batch_request(chunk))
+        except requests.RequestException as e:
+            yield from batch_failed(zone_id, chunk, e)
+            continue
+        results, fallback = split_batch_result(zone_id, chunk, resp)
+        yield from results
+        for kind, body in fallback:
+            try:
+                ok, detail = write_record(zone_id, body)
+            except requests.RequestException as e:
+                ok, detail = False, str(e)
+            yield body, ok, detail
+
+def batch_update_records(zone_id, updates, batch_size=BATCH_SIZE):
+    """Apply ``(record, new_content)`` pairs through the ``dns_records/batch`` endpoint.
+
+    Yields ``(record, new_content, ok, detail)`` for every update.
+    """
+    by_id = {rec['id']: (rec, new_content) for rec, new_content in updates}
+    puts = [{'id': rec['id'], **record_payload(rec, new_content)} for rec, new_content in updates]
+    for body, ok, detail in batch_write_records(zone_id, puts=puts, batch_size=batch_size):
+        rec, new_content = by_id[body['id']]
+        yield rec, new_content, ok, detail
+
+def open_backup(path, mode='r', compressed=None):
+    """Open a backup file as text, gzip-compressed for ``.gz`` paths unless ``compressed`` says otherwise."""
+    if path.endswith('.gz') if compressed is None else compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def backup_records(zones, backup_file=DEFAULT_BACKUP_FILE):
+    """Stream all DNS records for all zones to a JSON Lines backup file.
+
+    Every record is written as one ``{"zone_id", "zone_name", "record"}`` line
+    while its page is being fetched, so memory use does not grow with the size
+    of the account. Paths ending in ``.gz`` are gzip-compressed. The previous
+    backup is only replaced when every zone was backed up in full; returns
+    whether it was.
+    """
+    tmp_file = f'{backup_file}.tmp'
+    failed = []
+    try:
+        with open_backup(tmp_file, 'w', compressed=backup_file.endswith('.gz')) as f:
+            for zone in zones:
+                zone_id = zone['id']
+                zone_name = zone['name']
+                count = 0
+                try:
+                    for rec in get_records(zone_id):
+                        f.write(json.dumps({'zone_id': zone_id, 'zone_name': zone_name, 'record': rec}, separators=(',', ':')) + '\n')
+                        count += 1
+                    log_success(f"Backed up {count} records for zone {zone_name}")
+                except Exception as e:
+                    log_error(f"Failed to backup zone {zone_name} after {count} records: {e}")
+                    failed.append(zone_name)
+        return finish_backup(tmp_file, backup_file, failed)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def finish_backup(tmp_file, backup_file, failed):
+    """Move a complete backup into place, or keep the previous one if any zone ``failed``."""
+    if failed:
+        log_error(f"Backup incomplete, {len(failed)} zone(s) failed ({', '.join(failed)}); "
+                  f"{backup_file} was left unchanged")
+        return False
+    os.replace(tmp_file, backup_file)
     log_success(f"Backup complete. Saved to {backup_file}")
+    return True
+
+def iter_backup(backup_file):
+    """Yield ``(zone_id, zone_name, record)`` from a backup file.
+
+    JSON Lines backups (optionally gzip-compressed) are read one line at a
+    time, whatever the file is called. Legacy single-document backups written
+    by older versions are recognised by their first line and still accepted,
+    but have to be loaded whole.
+    """
+    with open_backup(backup_file) as f:
+        first = f.readline()
+        try:
+            entry = json.loads(first)
+        except ValueError:
+            entry = None
+        if not (isinstance(entry, dict) and 'zone_id' in entry and 'record' in entry):
+            if not first.strip():
+                return
+            f.seek(0)
+            for zone_name, data in json.load(f).items():
+                for rec in data['records']:
+                    yield data['zone_id'], zone_name, rec
+            return
+        yield entry['zone_id'], entry['zone_name'], entry['record']
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['zone_id'], entry['zone_name'], entry['record']
+
+# Fields of a backed-up record that are managed by Cloudflare and never written back
+READ_ONLY_FIELDS = frozenset({
+    'id', 'zone_id', 'zone_name', 'created_on', 'modified_on', 'meta', 'locked', 'proxiable',
+    'comment_modified_on', 'tags_modified_on',
+})
 
+def plan_restore(zone_id, backup_records_, live_records=None):
+    """Diff backed-up records against the live zone.
+
+    Fetches the zone's live records once, unless they are passed in as
+    ``live_records``, and returns ``(unchanged, puts, posts)``:
+    the number of records that already match, bodies of records to overwrite
+    and bodies of records that no longer exist and have to be created. A
+    missing record counts as unchanged if a live record has the same type,
+    name and content.
+    """
+    live = {}
+    live_keys = set()
+    for rec in get_records(zone_id) if live_records is None else live_records:
+        live[rec['id']] = rec
+        live_keys.add((rec.get('type'), rec.get('name'), rec.get('content')))
+    unchanged = 0
+    puts = []
+    posts = []
+    for rec in backup_records_:
+        body = {k: v for k, v in rec.items() if k not in READ_ONLY_FIELDS}
+        current = live.get(rec.get('id'))
+        if current is None:
+            # A record recreated by an earlier restore has a new id but the same data
+            if (rec.get('type'), rec.get('name'), rec.get('content')) in live_keys:
+                unchanged += 1
+            else:
+                posts.append(body)
+        elif any(current.get(k) != v for k, v in body.items()):
+            puts.append({'id': rec['id'], **body})
+        else:
+            unchanged += 1
+    return unchanged, puts, posts
+
+def restore_records(backup_file=DEFAULT_BACKUP_FILE, entries=None):
+    """Restore DNS records from a backup file, writing only what differs from the live zones.
+
+    The backup is read incrementally one zone at a time. Each zone's live
+    records are fetched once, and only modified or missing records are
+    written, in batches. With DRY_RUN the planned writes are only printed.
+    ``entries`` may supply ``(zone_id, zone_name, record)`` tuples, e.g. from
+    a snapshot, instead of ``backup_file``.
+    """
+    entries = restore_entries(backup_file, entries)
+    if entries is None:
+        return
+    totals = defaultdict(int)
+    for (zone_id, zone_name), zone_entries in itertools.groupby(entries, key=lambda e: (e[0], e[1])):
+        try:
+            unchanged, puts, posts = plan_restore(zone_id, (rec for _, _, rec in zone_entries))
+        except Exception as e:
+            log_error(f"Failed to read live records of {zone_name}, skipping zone: {e}")
+            continue
+        totals['unchanged'] += unchanged
+        report_restore_plan(zone_name, unchanged, puts, posts)
+        if not DRY_RUN:
+            count_restore_results(zone_name, batch_write_records(zone_id, puts=puts, posts=posts), totals)
+    log_restore_summary(totals)
 
-def restore_records(backup_file='cf_backup.json'):
-    """Restore DNS records from a backup JSON file."""
+def restore_entries(backup_file, entries):
+    """Return ``entries``, or those of ``backup_file``; None if the file is missing."""
+    if entries is not None:
+        return entries
     if not os.path.exists(backup_file):
         log_error(f"Backup file {backup_file} not found.")
+        return None
+    return iter_backup(backup_file)
+
+def report_restore_plan(zone_name, unchanged, puts, posts):
+    """Print a zone's restore plan, and with DRY_RUN the writes it would make."""
+    log_info(f"{zone_name}: {unchanged} unchanged, {len(puts)} modified, {len(posts)} missing")
+    if DRY_RUN:
+        for body in puts:
+            log_dryrun(f"Would restore record {body.get('name')} ({body.get('type')}) in {zone_name}")
+        for body in posts:
+            log_dryrun(f"Would recreate record {body.get('name')} ({body.get('type')}) in {zone_name}")
+
+def count_restore_results(zone_name, results, counts):
+    """Report ``(body, ok, detail)`` restore writes and add them to ``counts``."""
+    for body, ok, detail in results:
+        if ok:
+            counts['updated' if 'id' in body else 'created'] += 1
+            log_success(f"Restored record {body.get('name')} ({body.get('type')}) in {zone_name}")
+        else:
+            counts['failed'] += 1
+            log_error(f"Failed to restore record {body.get('name')} in {zone_name}: {detail}")
+
+def log_restore_summary(counts):
+    """Print the totals of a restore run."""
+    log_success(f"Restore complete: {counts['unchanged']} unchanged, {counts['updated']} updated, "
+                f"{counts['created']} created, {counts['failed']} failed")
+
+class SnapshotStore:
+    """Directory of incremental, integrity-checked DNS snapshots.
+
+    Each distinct record set of a zone is stored once, as
+    ``zones/<zone_id>/<hash>.jsonl.gz``. The hash covers every record
+    independently of API order, so a zone that has not changed reuses the
+    file of an earlier snapshot. Every snapshot is a manifest in
+    ``manifests/`` naming the file of each zone, and any manifest can be
+    restored.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def zone_path(self, zone_id, digest):
+        return os.path.join(self.root, 'zones', zone_id, f'{digest}.jsonl.gz')
+
+    def manifest_path(self, snapshot_id):
+        return os.path.join(self.root, 'manifests', f'{snapshot_id}.json')
+
+    @staticmethod
+    def record_line(rec):
+        return json.dumps(rec, sort_keys=True, separators=(',', ':'))
+
+    @staticmethod
+    def digest(line_hashes):
+        """Combine ``(record_id, line_hash)`` pairs into a hash of the whole record set."""
+        combined = hashlib.sha256()
+        for _, line_hash in sorted(line_hashes):
+            combined.update(line_hash)
+        return combined.hexdigest()
+
+    def store_zone(self, zone):
+        """Fetch the records of ``zone`` and store them unless the same record set is stored already.
+
+        Records are streamed to a temporary file while they are hashed, so
+        memory use does not grow with the zone. Returns ``(digest, count)``.
+        """
+        directory = os.path.join(self.root, 'zones', zone['id'])
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f'.{os.getpid()}.tmp')
+        line_hashes = []
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for rec in get_records(zone['id']):
+                    line = self.record_line(rec)
+                    line_hashes.append((str(rec.get('id')), hashlib.sha256(line.encode('utf-8')).digest()))
+                    f.write(line + '\n')
+            digest = self.digest(line_hashes)
+            path = self.zone_path(zone['id'], digest)
+            if not os.path.exists(path):
+                os.replace(tmp_path, path)
+            return digest, len(line_hashes)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def snapshot_ids(self):
+        """Return the ids of all snapshots, oldest first."""
+        directory = os.path.join(self.root, 'manifests')
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+
+    def load_manifest(self, snapshot_id='latest'):
+        """Return the manifest of the latest snapshot taken at or before ``snapshot_id``.
+
+        Ids are UTC timestamps such as ``20250704T120000Z``; a prefix like
+        ``20250704T12`` selects the last snapshot of that hour.
+        """
+        ids = self.snapshot_ids()
+        if snapshot_id != 'latest':
+            ids = [i for i in ids if i <= snapshot_id or i.startswith(snapshot_id)]
+        if not ids:
+            raise ValueError(f"no snapshot matching '{snapshot_id}' in {self.root}")
+        with open(self.manifest_path(ids[-1]), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def snapshot(self, zones, concurrency=1):
+        """Take a snapshot of ``zones``, fetching up to ``concurrency`` zones in parallel."""
+        previous = self.load_manifest() if self.snapshot_ids() else None
+        previous_hashes = {z['id']: z['hash'] for z in previous['zones']} if previous else {}
+        snapshot_id = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        if os.path.exists(self.manifest_path(snapshot_id)):
+            snapshot_id += f'-{os.getpid()}'
+        manifest = {'id': snapshot_id, 'created': time.time(), 'parent': previous and previous['id'],
+                    'zones': [], 'failed': []}
+        changed = 0
+
+        def store(zone):
+            try:
+                return zone, self.store_zone(zone), None
+            except Exception as e:
+                return zone, None, e
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for zone, stored, error in pool.map(store, zones):
+                if error is not None:
+                    log_error(f"Failed to snapshot zone {zone['name']}: {error}")
+                    manifest['failed'].append(zone['name'])
+                    continue
+                digest, count = stored
+                manifest['zones'].append({'id': zone['id'], 'name': zone['name'], 'hash': digest, 'records': count})
+                if previous_hashes.get(zone['id']) != digest:
+                    changed += 1
+                    log_success(f"Stored {count} records for zone {zone['name']}")
+                elif DEBUG:
+                    debug(f"[SNAPSHOT] Zone {zone['name']} unchanged since snapshot {previous['id']}")
+        manifest['changed'] = changed
+        os.makedirs(os.path.dirname(self.manifest_path(snapshot_id)), exist_ok=True)
+        tmp_path = f'{self.manifest_path(snapshot_id)}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path(snapshot_id))
+        log_success(f"Snapshot {snapshot_id} saved to {self.root}: {len(manifest['zones'])} zones, "
+                    f"{changed} changed, {len(manifest['zones']) - changed} unchanged")
+        if manifest['failed']:
+            log_error(f"Snapshot {snapshot_id} is incomplete, {len(manifest['failed'])} zone(s) failed: "
+                      f"{', '.join(manifest['failed'])}")
+        return manifest
+
+    def verify(self, entry):
+        """Raise ValueError unless the stored records of a manifest zone entry still match its hash."""
+        path = self.zone_path(entry['id'], entry['hash'])
+        line_hashes = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    line_hashes.append((str(json.loads(line).get('id')), hashlib.sha256(line.encode('utf-8')).digest()))
+        if self.digest(line_hashes) != entry['hash']:
+            raise ValueError(f"{path} does not match its hash")
+
+    def iter_snapshot(self, manifest):
+        """Yield ``(zone_id, zone_name, record)`` for every zone of ``manifest`` that passes verification."""
+        for entry in manifest['zones']:
+            try:
+                self.verify(entry)
+            except (OSError, EOFError, ValueError) as e:
+                log_error(f"Skipping zone {entry['name']}, its snapshot is damaged: {e}")
+                continue
+            with gzip.open(self.zone_path(entry['id'], entry['hash']), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield entry['id'], entry['name'], json.loads(line)
+
+    def print_snapshots(self):
+        ids = self.snapshot_ids()
+        if not ids:
+            log_info(f"No snapshots in {self.root}")
+        for snapshot_id in ids:
+            with open(self.manifest_path(snapshot_id), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            records = sum(z['records'] for z in manifest['zones'])
+            failed = manifest.get('failed')
+            incomplete = f", {len(failed)} failed ({', '.join(failed)})" if failed else ''
+            print(f"{snapshot_id}  {len(manifest['zones'])} zones, {records} records, "
+                  f"{manifest.get('changed', 0)} changed{incomplete}")
+
+def async_engine_available():
+    """Return True if the optional httpx package needed by ``--engine async`` is installed."""
+    import importlib.util
+    return importlib.util.find_spec('httpx') is not None
+
+class AsyncCloudflareClient:
+    """asyncio counterpart of CloudflareClient, built on the optional httpx package.
+
+    It reuses the headers, rate limiter, timeout and retry settings of a
+    CloudflareClient. Up to ``max_in_flight`` requests share one event loop
+    thread instead of a thread each. Use it with ``async with``.
+    """
+
+    def __init__(self, client, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        import asyncio
+        import httpx
+        # Created here so they belong to the running event loop
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.session = httpx.AsyncClient(
+            timeout=self.client.timeout,
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.aclose()
+
+    async def request(self, method, url, retries=None, **kwargs):
+        """Send an authenticated API request with the retry policy of CloudflareClient.request()."""
+        import asyncio
+        import httpx
+        client = self.client
+        headers = client.headers if client.headers is not None else HEADERS
+        limiter = client.rate_limiter
+        retries = client.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            if attempt:
+                METRICS.count('retries')
+            if limiter:
+                waited = time.perf_counter()
+                await limiter.acquire_async()
+                METRICS.count('rate_limit_wait_seconds', time.perf_counter() - waited)
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    resp = await self.session.request(method, url, headers=headers, **kwargs)
+                except httpx.TransportError as e:
+                    METRICS.observe_request(method, 'error', time.perf_counter() - start)
+                    delay = None if last else client.retry_delay(method, url, attempt, error=e)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+            METRICS.observe_request(method, resp.status_code, time.perf_counter() - start,
+                                    len(resp.request.content or b''), len(resp.content))
+            delay = None if last else client.retry_delay(method, url, attempt, resp, limiter=limiter)
+            if delay is None:
+                return resp
+            await asyncio.sleep(delay)
+        return resp
+
+async def async_paginate(client, url, params=None, per_page=500, prefetch=4, object_hook=None):
+    """Async counterpart of paginate().
+
+    Once the first page reports the page count, up to ``prefetch`` of the
+    following pages are requested concurrently. Results are still yielded in
+    order.
+    """
+    import asyncio
+    params = dict(params or {})
+    params['per_page'] = per_page
+
+    async def fetch(page):
+        resp = await client.request('GET', url, params={**params, 'page': page})
+        resp.raise_for_status()
+        return resp.json(object_hook=object_hook)
+
+    payload = await fetch(1)
+    total_pages = (payload.get('result_info') or {}).get('total_pages') or 1
+    next_page = 2
+    pending = []
+    try:
+        while True:
+            while next_page <= total_pages and len(pending) < prefetch:
+                pending.append(asyncio.ensure_future(fetch(next_page)))
+                next_page += 1
+            for item in payload.get('result') or []:
+                yield item
+            if not pending:
+                return
+            payload = await pending.pop(0)
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def collect(items):
+    """Gather the items of an async iterator into a list."""
+    return [item async for item in items]
+
+async def async_get_zones(client, zone_filter=None):
+    """Async counterpart of get_zones(); returns a list."""
+    import asyncio
+    if zone_filter is None:
+        zone_filter = ZoneFilter.parse(TARGET_DOMAIN)
+    queries = zone_filter.queries() if zone_filter else None
+    listings = await asyncio.gather(*(
+        collect(async_paginate(client, f'{API_BASE}/zones', query, per_page=50))
+        for query in (queries if queries is not None else [None])
+    ))
+    zones = list(unique_by_id(z for listing in listings for z in listing))
+    if zone_filter:
+        return [z for z in zones if zone_filter.matches(z['name'])]
+    return zones
+
+async def async_get_records(client, zone_id, record_type=None, filters=None, compact=False):
+    """Async counterpart of get_records(); returns a list."""
+    params = dict(filters or {})
+    if record_type:
+        params['type'] = record_type
+    return await collect(async_paginate(client, f'{API_BASE}/zones/{zone_id}/dns_records', params,
+                                        object_hook=Record.json_hook if compact else None))
+
+async def async_fetch_zone_records(client, zone):
+    """Async counterpart of fetch_zone_records(); the filtered queries run concurrently."""
+    import asyncio
+    if RECORD_CACHE:
+        serial = await asyncio.to_thread(zone_serial, zone)
+        records = RECORD_CACHE.cached_records(zone, serial)
+        if records is None or zone_has_changes(zone, records):
+            records = await async_get_records(client, zone['id'], compact=True)
+            RECORD_CACHE.store_records(zone, records, serial)
+        return records
+    queries = record_queries(zone)
+    if queries is None:
+        return await async_get_records(client, zone['id'], compact=True)
+    results = await asyncio.gather(*(async_get_records(client, zone['id'], filters=query, compact=True)
+                                     for query in queries))
+    return list(unique_by_id(rec for records in results for rec in records))
+
+async def async_write_record(client, zone_id, body):
+    """Async counterpart of write_record()."""
+    body = dict(body)
+    rec_id = body.pop('id', None)
+    if rec_id:
+        resp = await client.request('PUT', f'{API_BASE}/zones/{zone_id}/dns_records/{rec_id}', json=body)
+    else:
+        resp = await client.request('POST', f'{API_BASE}/zones/{zone_id}/dns_records', json=body)
+    return resp.is_success, resp.text
+
+async def async_batch_write_records(client, zone_id, puts=(), posts=(), batch_size=BATCH_SIZE):
+    """Async counterpart of batch_write_records(); returns a list of ``(body, ok, detail)``.
+
+    Batches are sent concurrently, and so are the single writes that replace
+    a rejected batch.
+    """
+    import asyncio
+    import httpx
+    url = f'{API_BASE}/zones/{zone_id}/dns_records/batch'
+    operations = [('puts', body) for body in puts] + [('posts', body) for body in posts]
+
+    async def write(body):
+        try:
+            return await async_write_record(client, zone_id, body)
+        except httpx.HTTPError as e:
+            return False, str(e)
+
+    async def send(chunk):
+        try:
+            resp = await client.request('POST', url, json=batch_request(chunk))
+        except httpx.HTTPError as e:
+            return batch_failed(zone_id, chunk, e)
+        results, fallback = split_batch_result(zone_id, chunk, resp)
+        singles = await asyncio.gather(*(write(body) for kind, body in fallback))
+        return results + [(body, ok, detail) for (kind, body), (ok, detail) in zip(fallback, singles)]
+
+    chunks = [operations[start:start + batch_size] for start in range(0, len(operations), batch_size)]
+    return [result for results in await asyncio.gather(*(send(chunk) for chunk in chunks)) for result in results]
+
+async def async_batch_update_records(client, zone_id, updates, batch_size=BATCH_SIZE):
+    """Async counterpart of batch_update_records(); returns a list of ``(record, new_content, ok, detail)``."""
+    by_id = {rec['id']: (rec, new_content) for rec, new_content in updates}
+    puts = [{'id': rec['id'], **record_payload(rec, new_content)} for rec, new_content in updates]
+    results = []
+    for body, ok, detail in await async_batch_write_records(client, zone_id, puts=puts, batch_size=batch_size):
+        rec, new_content = by_id[body['id']]
+        results.append((rec, new_content, ok, detail))
+    return results
+
+async def async_backup_records(client, zones, backup_file=DEFAULT_BACKUP_FILE, concurrency=1):
+    """Async counterpart of backup_records().
+
+    Up to ``concurrency`` zones are fetched at once. Each zone is written to
+    the backup as soon as all its records have arrived, so zones may appear
+    in any order.
+    """
+    import asyncio
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(zone):
+        async with limit:
+            try:
+                return zone, await async_get_records(client, zone['id']), None
+            except Exception as e:
+                return zone, None, e
+
+    tmp_file = f'{backup_file}.tmp'
+    failed = []
+    try:
+        with open_backup(tmp_file, 'w', compressed=backup_file.endswith('.gz')) as f:
+            for done in asyncio.as_completed([fetch(zone) for zone in zones]):
+                zone, records, error = await done
+                if error is not None:
+                    log_error(f"Failed to backup zone {zone['name']}: {error}")
+                    failed.append(zone['name'])
+                    continue
+                for rec in records:
+                    f.write(json.dumps({'zone_id': zone['id'], 'zone_name': zone['name'], 'record': rec}, separators=(',', ':')) + '\n')
+                log_success(f"Backed up {len(records)} records for zone {zone['name']}")
+        return finish_backup(tmp_file, backup_file, failed)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+async def async_restore_records(client, backup_file=DEFAULT_BACKUP_FILE, concurrency=1, entries=None):
+    """Async counterpart of restore_records().
+
+    Up to ``concurrency`` zones are restored at once, and only those zones of
+    the backup are held in memory.
+    """
+    import asyncio
+    entries = restore_entries(backup_file, entries)
+    if entries is None:
         return
-    with open(backup_file, 'r', encoding='utf-8') as f:
-        all_data = json.load(f)
-    for zone_name, data in all_data.items():
-        zone_id = data['zone_id']
-        records = data['records']
-        for rec in records:
-            rec_id = rec.get('id')
-            rec_data = {k: v for k, v in rec.items() if k not in ['id', 'zone_id', 'zone_name', 'created_on', 'modified_on']}
+    limit = asyncio.Semaphore(max(1, concurrency))
+    totals = defaultdict(int)
+
+    async def restore_zone(zone_id, zone_name, records):
+        try:
             try:
-                # Try to update if exists, else create
-                if rec_id:
-                    url = f'https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{rec_id}'
-                    resp = requests.put(url, headers=HEADERS, json=rec_data)
-                else:
-                    url = f'https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records'
-                    resp = requests.post(url, headers=HEADERS, json=rec_data)
-                resp.raise_for_status()
-                log_success(f"Restored record {rec.get('name')} ({rec.get('type')}) in {zone_name}")
+                live = await async_get_records(client, zone_id)
             except Exception as e:
-                log_error(f"Failed to restore record {rec.get('name')} in {zone_name}: {e}")
+                log_error(f"Failed to read live records of {zone_name}, skipping zone: {e}")
+                return
+            unchanged, puts, posts = plan_restore(zone_id, records, live)
+            totals['unchanged'] += unchanged
+            report_restore_plan(zone_name, unchanged, puts, posts)
+            if not DRY_RUN:
+                results = await async_batch_write_records(client, zone_id, puts=puts, posts=posts)
+                count_restore_results(zone_name, results, totals)
+        finally:
+            limit.release()
+
+    tasks = []
+    for (zone_id, zone_name), zone_entries in itertools.groupby(entries, key=lambda e: (e[0], e[1])):
+        # Wait for a free slot before reading the next zone from the backup
+        await limit.acquire()
+        tasks.append(asyncio.ensure_future(restore_zone(zone_id, zone_name, [rec for _, _, rec in zone_entries])))
+    await asyncio.gather(*tasks)
+    log_restore_summary(totals)
+
+class ReportSink:
+    """Receives one row per processed record and streams it to its output.
+
+    ``skipped`` controls rows with status ``skipped``: ``keep`` writes them,
+    ``count`` only includes them in the totals and ``drop`` ignores them.
+    The base class writes nothing and only keeps the per-status totals.
+    """
+
+    FIELDS = ('domain', 'record_id', 'type', 'old', 'new', 'status')
+
+    def __init__(self, skipped='keep'):
+        self.skipped = skipped
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, row):
+        if row['status'] == 'skipped' and self.skipped != 'keep':
+            if self.skipped == 'count':
+                with self.lock:
+                    self.counts['skipped'] += 1
+            return
+        with self.lock:
+            self.counts[row['status']] += 1
+            self.write(row)
+
+    def write(self, row):
+        pass
+
+    def close(self):
+        pass
+
+class HtmlReportSink(ReportSink):
+    """Stream rows into an HTML table."""
 
-def generate_html_report(changes, output_file='report.html'):
-    html_header = """<!DOCTYPE html>
+    HEADER = """<!DOCTYPE html>
 <html lang='en'>
 <head>
     <meta charset='utf-8'>
@@ -348,17 +2030,161 @@ def generate_html_report(changes, output_file='report.html'):
 <table>
 <tr><th>Domain</th><th>Record ID</th><th>Type</th><th>Old Content</th><th>New Content</th><th>Status</th></tr>
 """
-    rows = []
-    for c in changes:
-        rows.append(
-            f"<tr><td>{c['domain']}</td><td>{c['record_id']}</td><td>{c['type']}</td><td>{c.get('old','')}</td><td>{c.get('new','')}</td><td>{c['status']}</td></tr>"
-        )
-    html_footer = """</table>
-</body>
-</html>"""
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_header + "\n".join(rows) + html_footer)
-    log_success(f"HTML report generated: {output_file}")
+
+    def __init__(self, path, skipped='keep'):
+        super().__init__(skipped)
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write(self.HEADER)
+
+    def write(self, row):
+        cells = ''.join(f"<td>{html.escape(str(row.get(k) or ''))}</td>" for k in self.FIELDS)
+        self.file.write(f"<tr>{cells}</tr>\n")
+
+    def close(self):
+        totals = ' | '.join(f"{status}: {count}" for status, count in sorted(self.counts.items()))
+        self.file.write(f"</table>\n<p>{html.escape(totals)}</p>\n</body>\n</html>")
+        self.file.close()
+
+class CsvReportSink(ReportSink):
+    """Stream rows into a CSV file."""
+
+    def __init__(self, path, skipped='keep'):
+        super().__init__(skipped)
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.FIELDS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+class JsonlReportSink(ReportSink):
+    """Stream rows as JSON Lines."""
+
+    def __init__(self, path, skipped='keep'):
+        super().__init__(skipped)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        self.file.write(json.dumps({k: row.get(k) for k in self.FIELDS}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+def open_report(path, skipped='keep'):
+    """Return the report sink for ``path`` based on its extension (HTML by default)."""
+    if not path:
+        return ReportSink(skipped)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return CsvReportSink(path, skipped)
+    if ext in ('.jsonl', '.ndjson'):
+        return JsonlReportSink(path, skipped)
+    return HtmlReportSink(path, skipped)
+
+REPORT = ReportSink()
+
+class RunJournal:
+    """Append-only JSON Lines journal of an update run, read back by ``--resume``.
+
+    The selected zones are written when the run starts. Each zone's planned
+    writes, their outcomes, and the zone's completion follow as they happen.
+    Lines are flushed immediately, so the journal survives a crash. A zone is
+    only marked done when its records were fetched and every write succeeded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.pending = set()
+
+    @staticmethod
+    def load(path):
+        """Return the state of the journal at ``path``, or None if there is none.
+
+        The state is a dict with the run's ``fingerprint``, its ``zones``, the
+        ``done`` zones mapped to their ``[total, updated, skipped]``, and
+        whether the run was ``complete``.
+        """
+        if not os.path.exists(path):
+            return None
+        state = None
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by the crash being recovered from
+                    continue
+                event = entry.get('event')
+                if event == 'start':
+                    state = {'fingerprint': entry['fingerprint'], 'zones': entry['zones'], 'done': {}, 'complete': False}
+                elif state is None:
+                    continue
+                elif event == 'zone_done':
+                    state['done'][entry['zone_id']] = entry['counts']
+                elif event == 'complete':
+                    state['complete'] = True
+        return state
+
+    def write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self.file.flush()
+
+    def start(self, fingerprint, zones):
+        """Begin a new journal for a run over ``zones``."""
+        self.pending = {z['id'] for z in zones}
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.write({'event': 'start', 'time': time.time(), 'fingerprint': fingerprint,
+                    'zones': [{k: z.get(k) for k in ('id', 'name', 'modified_on')} for z in zones]})
+
+    def reopen(self, zones):
+        """Continue appending to an existing journal whose unfinished zones are ``zones``."""
+        self.pending = {z['id'] for z in zones}
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.write({'event': 'resume', 'time': time.time()})
+
+    def planned(self, zone_id, updates):
+        for rec, new_content in updates:
+            self.write({'event': 'planned', 'zone_id': zone_id, 'record_id': rec['id'],
+                        'old': rec['content'], 'new': new_content})
+
+    def results(self, zone_id, results):
+        for rec, new_content, ok, detail in results:
+            self.write({'event': 'written', 'zone_id': zone_id, 'record_id': rec['id'], 'ok': ok})
+
+    def zone_done(self, zone_id, total, updated, skipped):
+        self.write({'event': 'zone_done', 'zone_id': zone_id, 'counts': [total, updated, skipped]})
+        with self.lock:
+            os.fsync(self.file.fileno())
+            self.pending.discard(zone_id)
+
+    def complete(self):
+        self.write({'event': 'complete', 'time': time.time()})
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+def jobs_fingerprint(jobs):
+    """Return a short hash identifying what ``jobs`` would change, to match a journal to its run."""
+    description = [
+        {
+            'zones': job.zone_filter.patterns,
+            'new_ip': job.new_ip,
+            'new_ipv6': job.new_ipv6,
+            'mappings': sorted((str(old), new) for old, new in job.matcher.mapping.items()),
+            'record_types': sorted(job.record_types),
+            'name_contains': job.name_contains,
+        }
+        for job in jobs
+    ]
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()[:16]
 
 def prompt_for_env():
     """Prompt the user for all required environment variables."""
@@ -391,167 +2217,595 @@ def prompt_for_env():
         'CENSOR': censor
     }
 
-def main():
-    """Entry point for running the update or backup logic."""
-    import argparse
-    import json
-    check_for_update()
-    init_env()
-    print_banner()
-    print("\n" + "="*50)
-    print(f"{GREEN}🚀 Starting Cloudflare DNS update script for {TARGET_DOMAIN or 'all zones'}!{RESET}")
-    print("="*50 + "\n")
-    print_censored_env()
-    help_epilog = """Environment variables:\n"
-    help_epilog += "  CLOUDFLARE_API_TOKEN  Cloudflare API token with DNS edit permissions (required)\n"
-    help_epilog += "  NEW_IP                New IP address to set for records (required)\n"
-    help_epilog += "  OLD_IP                Existing IP address to replace (optional)\n"
-    help_epilog += "  TARGET_DOMAIN         Only update this zone (optional, default: all zones)\n"
-    help_epilog += "  DRY_RUN               Set to 1 to preview changes without applying\n"
-    help_epilog += "  DEBUG                 Set to 1 for verbose logging\n"
-    help_epilog += "  CENSOR                Set to 0 to show uncensored environment values\n"""  # noqa: E501
+def zone_record_types(zone):
+    """Return the record types that the jobs applying to ``zone`` can change."""
+    return set().union(*(job.candidate_types() for job in JOBS if job.matches_zone(zone['name'])))
 
-    parser = argparse.ArgumentParser(
-        description='Cloudflare DNS update script with backup/restore',
-        formatter_class=argparse.RawTextHelpFormatter,
-        epilog=help_epilog,
-    )
-    parser.add_argument('-v', '--version', action='version', version=f'%(prog)s {__version__}')
-    parser.add_argument('--backup', action='store_true', help='Backup all DNS records to cf_backup.json')
-    parser.add_argument('--restore', action='store_true', help='Restore DNS records from cf_backup.json')
-    parser.add_argument('--html-report', metavar='FILE', help='Write HTML report of changes')
-    args = parser.parse_args()
-    global HTML_REPORT
-    HTML_REPORT = args.html_report
+def jobs_zone_filter():
+    """Return a ZoneFilter covering every job, or None if some job applies to all zones."""
+    if not JOBS or not all(job.zone_filter for job in JOBS):
+        return None
+    return ZoneFilter([p for job in JOBS for p in job.zone_filter.patterns])
 
-    zones = get_zones()
-    if args.backup:
-        backup_records(zones)
-        return
-    if args.restore:
-        restore_records()
-        return
+def record_queries(zone):
+    """Return dns_records filters that together find every record the jobs may change in ``zone``.
+
+    Records can only change if they contain one of the old addresses, or are
+    A/AAAA records of a job with ``new_ip``/``new_ipv6``, so those are the
+    queries sent. The record type and name are narrowed as well when every
+    job agrees on them. Returns None when the whole zone has to be fetched
+    instead, and an empty list when nothing in the zone can change.
+    """
+    zone_jobs = [job for job in JOBS if job.matches_zone(zone['name'])]
+    types = zone_record_types(zone)
+    if not types:
+        return []
+    names = {job.name_contains for job in zone_jobs}
+    base = {}
+    if len(types) == 1:
+        base['type'] = next(iter(types))
+    if len(names) == 1 and None not in names:
+        base['name.contains'] = next(iter(names))
+    queries = []
+    whole_types = set()
+    addresses = set()
+    for job in zone_jobs:
+        # new_ip and new_ipv6 rewrite every A/AAAA record, whatever it currently holds
+        for rtype, new in (('A', job.new_ip), ('AAAA', job.new_ipv6)):
+            if new and rtype in job.record_types and rtype not in whole_types:
+                whole_types.add(rtype)
+                queries.append({**base, 'type': rtype})
+        addresses.update(job.matcher.mapping)
+    if types <= whole_types:
+        return queries
+    if any(addr.version == 6 for addr in addresses):
+        # IPv6 addresses have several spellings; only the local matcher finds them all
+        return [base] if base else None
+    # A/AAAA record content is the bare address, so it can be matched exactly
+    content_filter = 'content.exact' if types <= {'A', 'AAAA'} else 'content.contains'
+    for addr in sorted(addresses):
+        query = {**base, content_filter: str(addr)}
+        if query not in queries:
+            queries.append(query)
+    if len(queries) > MAX_RECORD_QUERIES:
+        # Past a few queries a plain listing of the zone is cheaper
+        return [base] if base else None
+    return queries
+
+def planned_content(zone_jobs, record_type, name, content):
+    """Return the content a record gets from ``zone_jobs``; every job sees the content as rewritten by the jobs before it."""
+    new_content = str(content)
+    for job in zone_jobs:
+        new_content = job.apply(record_type, new_content, name)
+    return new_content
+
+def zone_has_changes(zone, records):
+    """Return whether any of the compact ``records`` would be rewritten by the jobs of ``zone``."""
+    zone_jobs = [job for job in JOBS if job.matches_zone(zone['name'])]
+    record_types = zone_record_types(zone)
+    return any(rec.type in record_types and rec.content
+               and planned_content(zone_jobs, rec.type, rec.name, rec.content) != rec.content
+               for rec in records)
+
+def plan_zone_updates(zone, grouped):
+    """Decide which records of ``zone`` change and report the ones that do not.
+
+    ``grouped`` is the zone's ``{type: [Record]}``. Returns ``(total, skipped,
+    planned)`` where ``planned`` holds the ``(record, new_content)`` writes.
+    """
+    zone_id = zone['id']
     total = 0
-    updated = 0
     skipped = 0
-    # Support more DNS record types
-    # Cloudflare supports a wide range of DNS record types.
-    # This list determines which types we will iterate over when updating.
-    record_types = [
-        'A', 'AAAA', 'CNAME', 'TXT', 'SRV', 'MX', 'NS', 'PTR', 'CAA', 'CERT', 'DNSKEY', 'DS', 'LOC', 'NAPTR', 'SMIMEA', 'SSHFP', 'SVCB', 'TLSA', 'URI'
-    ]
-    OLD_IP = os.getenv('OLD_IP')
-    # Iterate over every zone returned by the API
-    for zone in zones:
-        zone_id = zone['id']
-        if DEBUG:
-            debug(f"Found zone ID: {zone_id}")
-        all_records = []
-        # Fetch records of each supported type
-        for rtype in record_types:
-            try:
-                recs = get_records(zone_id, rtype)
-                all_records.extend(recs)
-            except Exception as e:
-                log_error(f"Failed to fetch {rtype} records for zone {zone_id}: {e}")
-                if DEBUG:
-                    debug(f"[ERROR] Failed to fetch {rtype} records for zone {zone_id}: {e}")
-        # Now iterate through every retrieved record
+    zone_jobs = [job for job in JOBS if job.matches_zone(zone['name'])]
+    all_records = [rec for rtype in RECORD_TYPES for rec in grouped.get(rtype, [])]
+    planned = []
+    # Checked once per zone so suppressed per-record messages cost nothing.
+    # Text output is logged in blocks; JSON keeps one object per record
+    show_detail = LOG.isEnabledFor(DETAIL)
+    block = DetailBlock() if show_detail and LOG_FORMAT == 'text' else None
+    # Now iterate through every retrieved record
+    with METRICS.phase('match'):
         for rec in all_records:
             total += 1
+            # Plain attribute reads; this loop runs once per record of the account
+            rec_id, rtype, name, content = rec.id, rec.type, rec.name, rec.content
             if DEBUG:
-                debug(f"Raw record: id={rec['id']} type={rec['type']} name={rec['name']} content={rec['content']}")
-            if not all([rec.get('id'), rec.get('name'), rec.get('content')]):
+                debug(f"Raw record: id={rec_id} type={rtype} name={name} content={content}")
+            if not (rec_id and name and content):
                 skipped += 1
                 log_info(f"[SKIP] Empty field in record {rec}")
                 if DEBUG:
                     debug(f"[DEBUG] Skipped: Empty field in record {rec}")
-                CHANGES.append({
-                    'domain': rec.get('name'),
-                    'record_id': rec.get('id'),
-                    'type': rec.get('type'),
-                    'old': rec.get('content'),
-                    'new': rec.get('content'),
+                REPORT.add({
+                    'domain': name,
+                    'record_id': rec_id,
+                    'type': rtype,
+                    'old': content,
+                    'new': content,
                     'status': 'skipped'
                 })
                 continue
-            should_update = False
-            new_content = rec['content']
-            # Determine if this record needs to be changed
-            if rec['type'] == 'A':
-                # For A records we simply compare with the desired NEW_IP
-                if rec['content'] != NEW_IP:
-                    should_update = True
-                    new_content = NEW_IP
-            elif OLD_IP and OLD_IP in str(rec['content']):
-                should_update = True
-                new_content = str(rec['content']).replace(OLD_IP, NEW_IP)
+            new_content = planned_content(zone_jobs, rtype, name, content)
+            should_update = new_content != content
             if not should_update:
                 skipped += 1
-                censored_id = censor_value(rec['id'], 'id')
-                censored_name = censor_value(rec['name'], 'name')
-                print(f"⏭️  Skipped record {censored_id} ({censored_name}) [{rec['type']}] (no match or unchanged)")
-                if DEBUG:
-                    debug(f"[SKIP] Record {censored_id} ({censored_name}) [{rec['type']}] not matching OLD_IP or already updated")
-                CHANGES.append({
-                    'domain': rec['name'],
-                    'record_id': rec['id'],
-                    'type': rec['type'],
-                    'old': rec['content'],
-                    'new': rec['content'],
+                if block is not None:
+                    block.add(f"⏭️  Skipped record {censor_value(rec_id, 'id')} ({censor_value(name, 'name')}) "
+                              f"[{rtype}] (no match or unchanged)")
+                elif show_detail:
+                    record_id = censor_value(rec_id, 'id')
+                    log_detail("⏭️  Skipped record %s (%s) [%s] (no match or unchanged)",
+                               record_id, censor_value(name, 'name'), rtype,
+                               zone_id=zone_id, record_id=record_id, status='skipped')
+                REPORT.add({
+                    'domain': name,
+                    'record_id': rec_id,
+                    'type': rtype,
+                    'old': content,
+                    'new': content,
                     'status': 'skipped'
                 })
                 continue
-            censored_id = censor_value(rec['id'], 'id')
-            censored_name = censor_value(rec['name'], 'name')
-            print(f"{'-'*40}\n🌐 Domain: {censored_name}\n🆔 Record ID: {censored_id}\n📦 Zone ID: {zone_id}\n📄 Type: {rec['type']}\n➡️  Current: {rec['content']}\n➡️  New: {new_content}")
+            if block is not None:
+                block.add(f"{'-' * 40}\n🌐 Domain: {censor_value(name, 'name')}\n🆔 Record ID: {censor_value(rec_id, 'id')}\n"
+                          f"📦 Zone ID: {zone_id}\n📄 Type: {rtype}\n➡️  Current: {content}\n➡️  New: {new_content}")
+            elif show_detail:
+                record_id = censor_value(rec_id, 'id')
+                log_detail("%s\n🌐 Domain: %s\n🆔 Record ID: %s\n📦 Zone ID: %s\n📄 Type: %s\n➡️  Current: %s\n➡️  New: %s",
+                           '-' * 40, censor_value(name, 'name'), record_id, zone_id,
+                           rtype, content, new_content,
+                           zone_id=zone_id, record_id=record_id, old=content, new=new_content)
             # Perform the update unless running in dry-run mode
             if DRY_RUN:
-                log_dryrun(f"Would update record {rec['id']} ({rec['name']}) [{rec['type']}] in zone {zone_id}: current={rec['content']}, new={new_content}")
-                if DEBUG:
-                    debug(f"[DRY RUN] Would update record {rec['id']} ({rec['name']}) [{rec['type']}] in zone {zone_id}: current={rec['content']}, new={new_content}")
-                CHANGES.append({
-                    'domain': rec['name'],
-                    'record_id': rec['id'],
-                    'type': rec['type'],
-                    'old': rec['content'],
+                # Dry-run lines stay at INFO so --quiet still lists them; flush first to keep the order
+                if block is not None:
+                    block.flush()
+                log_dryrun("Would update record %s (%s) [%s] in zone %s: current=%s, new=%s",
+                           rec_id, name, rtype, zone_id, content, new_content)
+                REPORT.add({
+                    'domain': name,
+                    'record_id': rec_id,
+                    'type': rtype,
+                    'old': content,
                     'new': new_content,
                     'status': 'dry-run'
                 })
             else:
-                ok, resp = update_generic_record(zone_id, rec, new_content)
-                if ok:
-                    updated += 1
-                    log_success(f"Updated record {rec['id']} ({rec['name']}) [{rec['type']}]" )
-                    if DEBUG:
-                        debug(f"[SUCCESS] Updated record {rec['id']} [{rec['type']}]" )
-                    CHANGES.append({
-                        'domain': rec['name'],
-                        'record_id': rec['id'],
-                        'type': rec['type'],
-                        'old': rec['content'],
-                        'new': new_content,
-                        'status': 'updated'
-                    })
+                planned.append((rec, new_content))
+    if block is not None:
+        block.flush()
+    return total, skipped, planned
+
+def report_update_results(zone_id, results):
+    """Report ``(record, new_content, ok, detail)`` write results and return the number applied."""
+    updated = 0
+    for rec, new_content, ok, resp in results:
+        if ok:
+            updated += 1
+            log_success("Updated record %s (%s) [%s]", rec['id'], rec['name'], rec['type'])
+            REPORT.add({
+                'domain': rec['name'],
+                'record_id': rec['id'],
+                'type': rec['type'],
+                'old': rec['content'],
+                'new': new_content,
+                'status': 'updated'
+            })
+        else:
+            log_error(f"Failed to update record {rec['id']} ({rec['name']}) [{rec['type']}]" )
+            if DEBUG:
+                debug(f"[ERROR] Failed to update record {rec['id']} [{rec['type']}]: {resp}")
+            REPORT.add({
+                'domain': rec['name'],
+                'record_id': rec['id'],
+                'type': rec['type'],
+                'old': rec['content'],
+                'new': new_content,
+                'status': 'failed'
+            })
+    return updated
+
+def finish_zone(zone_id, total, skipped, results, fetched=True):
+    """Report a zone's write results, journal its outcome and return ``(total, updated, skipped, clean)``.
+
+    The zone is ``clean``, and only then journaled as done, when its records
+    were ``fetched`` and every write succeeded, so ``--resume`` retries
+    everything else.
+    """
+    updated = report_update_results(zone_id, results)
+    clean = fetched and updated == len(results)
+    if JOURNAL:
+        JOURNAL.results(zone_id, results)
+        if clean:
+            JOURNAL.zone_done(zone_id, total, updated, skipped)
+    return total, updated, skipped, clean
+
+def process_zone(zone):
+    """Update every matching record in a zone and return ``(total, updated, skipped, clean)``."""
+    zone_id = zone['id']
+    if DEBUG:
+        debug(f"Found zone ID: {zone_id}")
+    # Fetch every record of the zone in one paginated pass and sort by type locally;
+    # the single fetch is shared by every job that selects this zone
+    try:
+        with METRICS.phase('record_fetch'):
+            grouped = group_records_by_type(fetch_zone_records(zone), zone_record_types(zone))
+    except Exception as e:
+        log_error(f"Failed to fetch records for zone {zone_id}: {e}")
+        if DEBUG:
+            debug(f"[ERROR] Failed to fetch records for zone {zone_id}: {e}")
+        grouped = None
+    total, skipped, planned = plan_zone_updates(zone, grouped or {})
+    if JOURNAL:
+        JOURNAL.planned(zone_id, planned)
+    # Send the collected changes in as few batch requests as possible
+    with METRICS.phase('write'):
+        results = list(batch_update_records(zone_id, planned))
+    return finish_zone(zone_id, total, skipped, results, fetched=grouped is not None)
+
+async def run_async_backup_restore(backup, backup_file, concurrency=1, max_in_flight=DEFAULT_MAX_IN_FLIGHT, entries=None):
+    """Run an async backup (``backup=True``) or restore of ``backup_file`` or ``entries``."""
+    async with AsyncCloudflareClient(get_client(), max_in_flight) as client:
+        if backup:
+            await async_backup_records(client, await async_get_zones(client), backup_file, concurrency)
+        else:
+            await async_restore_records(client, backup_file, concurrency, entries)
+
+def select_zones(zones):
+    """Keep the zones that at least one job applies to."""
+    return [z for z in zones if any(job.matches_zone(z['name']) for job in JOBS)]
+
+async def async_process_zone(client, zone):
+    """Async counterpart of process_zone()."""
+    zone_id = zone['id']
+    if DEBUG:
+        debug(f"Found zone ID: {zone_id}")
+    try:
+        with METRICS.phase('record_fetch'):
+            grouped = group_records_by_type(await async_fetch_zone_records(client, zone), zone_record_types(zone))
+    except Exception as e:
+        log_error(f"Failed to fetch records for zone {zone_id}: {e}")
+        if DEBUG:
+            debug(f"[ERROR] Failed to fetch records for zone {zone_id}: {e}")
+        grouped = None
+    total, skipped, planned = plan_zone_updates(zone, grouped or {})
+    if JOURNAL:
+        JOURNAL.planned(zone_id, planned)
+    with METRICS.phase('write'):
+        results = await async_batch_update_records(client, zone_id, planned)
+    return finish_zone(zone_id, total, skipped, results, fetched=grouped is not None)
+
+async def async_update_zones(concurrency=1, max_in_flight=DEFAULT_MAX_IN_FLIGHT, zones=None):
+    """Process up to ``concurrency`` zones at once on one event loop.
+
+    The selected zones are listed unless ``zones`` is given. Returns the
+    ``(total, updated, skipped, clean)`` tuple of every zone.
+    """
+    import asyncio
+    async with AsyncCloudflareClient(get_client(), max_in_flight) as client:
+        if zones is None:
+            with METRICS.phase('zone_listing'):
+                zones = select_zones(await async_get_zones(client, zone_filter=jobs_zone_filter()))
+            if JOURNAL:
+                JOURNAL.start(jobs_fingerprint(JOBS), zones)
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(zone):
+            async with limit:
+                return await async_process_zone(client, zone)
+
+        return await asyncio.gather(*(run(zone) for zone in zones))
+
+def run_update(concurrency=1, jobs=None, engine='sync', max_in_flight=DEFAULT_MAX_IN_FLIGHT, resume=False,
+               resume_hint=True):
+    """Run the update pipeline over every selected zone and print a summary.
+
+    ``jobs`` defaults to the single job described by the environment. With
+    ``engine='async'`` the ``concurrency`` zones run as asyncio tasks instead
+    of threads, sharing ``max_in_flight`` concurrent requests. Unless DRY_RUN
+    is set, progress is journaled to JOURNAL_FILE; with ``resume`` the zones
+    the journal lists as done are skipped, and ``resume_hint`` suggests
+    ``--resume`` when zones are left unfinished.
+
+    Returns True when every zone was fetched and all of its writes succeeded.
+    """
+    global JOBS, REPORT, JOURNAL
+    JOBS = jobs or [build_default_job()]
+    state = RunJournal.load(JOURNAL_FILE) if resume and JOURNAL_FILE else None
+    if resume and state is None:
+        log_info(f"No journal found at {JOURNAL_FILE}, starting a new run.")
+    elif state and state['fingerprint'] != jobs_fingerprint(JOBS):
+        log_error(f"The journal {JOURNAL_FILE} belongs to a run with different settings; run without --resume to start over.")
+        sys.exit(1)
+    elif state and state['complete']:
+        log_info(f"The run journaled in {JOURNAL_FILE} already completed, nothing to resume.")
+        return True
+    JOURNAL = RunJournal(JOURNAL_FILE) if JOURNAL_FILE and not DRY_RUN else None
+    REPORT = open_report(REPORT_FILE, SKIPPED_ROWS)
+    total = 0
+    updated = 0
+    skipped = 0
+    failed = 0
+    try:
+        zones = None
+        if state:
+            zones = [z for z in state['zones'] if z['id'] not in state['done']]
+            log_info(f"Resuming: {len(state['done'])} of {len(state['zones'])} zones already done, {len(zones)} left")
+            # Carry the finished zones over so the summary covers the whole run
+            for zone_total, zone_updated, zone_skipped in state['done'].values():
+                total += zone_total
+                updated += zone_updated
+                skipped += zone_skipped
+            if JOURNAL:
+                JOURNAL.reopen(zones)
+        if engine == 'async':
+            import asyncio
+            results = asyncio.run(async_update_zones(concurrency, max_in_flight, zones))
+        else:
+            if zones is None:
+                with METRICS.phase('zone_listing'):
+                    zones = select_zones(get_zones(zone_filter=jobs_zone_filter()))
+                if JOURNAL:
+                    JOURNAL.start(jobs_fingerprint(JOBS), zones)
+            # Fan zones out over a bounded worker pool; every API call still passes
+            # through the shared rate limiter so workers cannot exceed the budget.
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                results = list(pool.map(process_zone, zones))
+        for zone_total, zone_updated, zone_skipped, clean in results:
+            total += zone_total
+            updated += zone_updated
+            skipped += zone_skipped
+            failed += not clean
+        if JOURNAL:
+            failed = max(failed, len(JOURNAL.pending))
+            if not failed:
+                JOURNAL.complete()
+        if failed:
+            hint = "; run again with --resume to retry them." if JOURNAL and resume_hint else "."
+            log_error(f"{failed} zone(s) did not finish cleanly{hint}")
+    finally:
+        REPORT.close()
+        if JOURNAL:
+            JOURNAL.close()
+    METRICS.count('records_total', total)
+    METRICS.count('records_updated', updated)
+    METRICS.count('records_skipped', skipped)
+    if RECORD_CACHE:
+        RECORD_CACHE.save()
+    if LOG_FORMAT == 'json':
+        log_success("DNS update script completed", total=total, updated=updated, skipped=skipped)
+    else:
+        print("\n" + "="*50)
+        print(f"{GREEN}🎉 DNS update script completed.{RESET}")
+        print(f"{CYAN}Total records: {total} | Updated: {updated} | Skipped: {skipped}{RESET}")
+        print("="*50)
+    if REPORT_FILE:
+        log_success(f"Report generated: {REPORT_FILE}")
+    if METRICS_OUT:
+        METRICS.write(METRICS_OUT)
+    return not failed
+
+def discover_ip(source):
+    """Return the current public IP reported by ``source``.
+
+    ``source`` is either an HTTP(S) URL answering with the address as plain
+    text, or ``interface`` for the local address of the outbound interface.
+    """
+    if source == 'interface':
+        # Connecting a UDP socket only selects a route; no packet is sent
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('1.1.1.1', 53))
+            return sock.getsockname()[0]
+    resp = get_client().request('GET', source, authenticated=False, retries=0, timeout=10)
+    resp.raise_for_status()
+    # Decode explicitly; plain-text IP services rarely declare a charset
+    return str(ipaddress.ip_address(resp.content.decode('ascii', 'ignore').strip()))
+
+def watch_ip(source, interval, run):
+    """Poll ``source`` every ``interval`` seconds and call ``run`` when the IP changes.
+
+    ``run`` returns whether every zone was updated; until it does, the same
+    IP is applied again on the next check.
+    """
+    global NEW_IP, NEW_IPV6, OLD_IP
+    configured_old_ip = OLD_IP
+    last_ip = None
+    log_info(f"Watching {source} for IP changes every {interval:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            try:
+                current_ip = discover_ip(source)
+            except Exception as e:
+                log_error(f"Failed to discover public IP from {source}: {e}")
+                current_ip = None
+            if current_ip and current_ip != last_ip:
+                log_info(f"Public IP is now {current_ip} (was {last_ip or 'unknown'})")
+                if ':' in current_ip:
+                    NEW_IPV6 = current_ip
                 else:
-                    log_error(f"Failed to update record {rec['id']} ({rec['name']}) [{rec['type']}]" )
-                    if DEBUG:
-                        debug(f"[ERROR] Failed to update record {rec['id']} [{rec['type']}]: {resp}")
-                    CHANGES.append({
-                        'domain': rec['name'],
-                        'record_id': rec['id'],
-                        'type': rec['type'],
-                        'old': rec['content'],
-                        'new': new_content,
-                        'status': 'failed'
-                    })
-    print("\n" + "="*50)
-    print(f"{GREEN}🎉 DNS update script completed.{RESET}")
-    print(f"{CYAN}Total records: {total} | Updated: {updated} | Skipped: {skipped}{RESET}")
-    print("="*50)
-    if HTML_REPORT:
-        generate_html_report(CHANGES, HTML_REPORT)
-    input("\nPress Enter to exit...")
+                    NEW_IP = current_ip
+                # Without an explicit OLD_IP, replace the previously seen address
+                OLD_IP = configured_old_ip or last_ip
+                try:
+                    if run():
+                        last_ip = current_ip
+                    else:
+                        log_error("Some zones were not updated, retrying on the next check")
+                except Exception as e:
+                    log_error(f"Update run failed, retrying on the next check: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        log_info("Watch mode stopped.")
+
+def main():
+    """Entry point for running the update or backup logic."""
+    import argparse
+    import json
+    help_epilog = """Environment variables:\n"
+    help_epilog += "  CLOUDFLARE_API_TOKEN  Cloudflare API token with DNS edit permissions (required)\n"
+    help_epilog += "  NEW_IP                New IP address to set for records (required)\n"
+    help_epilog += "  NEW_IPV6              New IPv6 address for AAAA records (optional)\n"
+    help_epilog += "  OLD_IP                Existing IP address to replace (optional)\n"
+    help_epilog += "  TARGET_DOMAIN         Only update these zones: comma-separated names, globs or\n"
+    help_epilog += "                        re:<regex> (optional, default: all zones)\n"
+    help_epilog += "  DRY_RUN               Set to 1 to preview changes without applying\n"
+    help_epilog += "  DEBUG                 Set to 1 for verbose logging\n"
+    help_epilog += "  CENSOR                Set to 0 to show uncensored environment values\n"""  # noqa: E501
+
+    parser = argparse.ArgumentParser(
+        description='Cloudflare DNS update script with backup/restore',
+        formatter_class=argparse.RawTextHelpFormatter,
+        epilog=help_epilog,
+    )
+    parser.add_argument('-v', '--version', action='version', version=f'%(prog)s {__version__}')
+    parser.add_argument('--backup', action='store_true', help='Backup all DNS records to the backup file')
+    parser.add_argument('--restore', action='store_true', help='Restore DNS records from the backup file')
+    parser.add_argument('--backup-file', metavar='FILE', default=DEFAULT_BACKUP_FILE,
+                        help=f'JSON Lines backup file, gzip-compressed if it ends in .gz (default: {DEFAULT_BACKUP_FILE})')
+    parser.add_argument('--snapshot-dir', metavar='DIR',
+                        help='Back up to, or restore from, an incremental snapshot store in DIR\ninstead of --backup-file')
+    parser.add_argument('--snapshot', metavar='ID', default='latest',
+                        help='Snapshot to restore: an id such as 20250704T120000Z, or a prefix of\none, picks the latest snapshot at or before it (default: latest)')
+    parser.add_argument('--list-snapshots', action='store_true', help='List the snapshots in --snapshot-dir')
+    parser.add_argument('--report', '--html-report', dest='report', metavar='FILE',
+                        help='Stream a report of changes to FILE as HTML, or as CSV / JSON Lines\nfor .csv / .jsonl paths')
+    parser.add_argument('--skipped-rows', choices=('keep', 'count', 'drop'), default='keep',
+                        help="Write skipped records to the report ('keep'), only count them\n('count') or leave them out entirely ('drop') (default: keep)")
+    parser.add_argument('--concurrency', metavar='N', type=int, default=1,
+                        help='Number of zones to process in parallel (default: 1); with --engine async\nthis also applies to backup and restore')
+    parser.add_argument('--rate-limit', metavar='REQ_PER_SEC', type=float, default=DEFAULT_RATE_LIMIT,
+                        help=f'Maximum API requests per second across all workers (default: {DEFAULT_RATE_LIMIT:g})')
+    parser.add_argument('--timeout', metavar='SECONDS', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'Timeout for each API request (default: {DEFAULT_TIMEOUT:g})')
+    parser.add_argument('--retries', metavar='N', type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f'Retries for rate-limited, failed or 5xx requests (default: {DEFAULT_MAX_RETRIES})')
+    parser.add_argument('--cache-ttl', metavar='SECONDS', type=float, default=0,
+                        help="Reuse records cached by earlier runs for this long, as long as the\nzone's SOA serial is unchanged (default: 0, disabled)")
+    parser.add_argument('--cache-file', metavar='FILE', default='cf_cache.json',
+                        help='Location of the record cache (default: cf_cache.json)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and update records whenever the public IP changes')
+    parser.add_argument('--watch-interval', metavar='SECONDS', type=float, default=60,
+                        help='Seconds between public IP checks in watch mode (default: 60)')
+    parser.add_argument('--ip-source', metavar='SOURCE', default=os.getenv('IP_SOURCE', DEFAULT_IP_SOURCE),
+                        help="URL returning the public IP as plain text, or 'interface' for the\n"
+                             f"address of the outbound network interface (default: {DEFAULT_IP_SOURCE})")
+    parser.add_argument('--metrics-out', metavar='FILE',
+                        help='Write request and phase metrics as JSON, or as a Prometheus\ntextfile if FILE ends in .prom')
+    parser.add_argument('--no-update-check', action='store_true',
+                        help='Skip the npm/GitHub version check at startup')
+    parser.add_argument('--no-banner', action='store_true', help='Do not print the ASCII banner')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Leave out the banner, the environment and the details of skipped and\nchanged records; updated, failed and dry-run records are still listed')
+    parser.add_argument('--log-format', choices=('text', 'json'), default='text',
+                        help="Console log format; 'json' writes one JSON object per line (default: text)")
+    parser.add_argument('--log-file', metavar='FILE',
+                        help=f'Also write the log to FILE, with debug messages when DEBUG=1\n(default with DEBUG=1: {DEFAULT_DEBUG_FILE})')
+    parser.add_argument('--jobs', metavar='FILE',
+                        help='Run every job from a JSON (or YAML) file in one non-interactive pass;\n'
+                             'each job lists zones, new_ip/old_ip, mappings and record_types')
+    parser.add_argument('--journal', metavar='FILE', default=DEFAULT_JOURNAL_FILE,
+                        help=f'Journal of planned and completed changes, used by --resume\n(default: {DEFAULT_JOURNAL_FILE})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the run recorded in the journal, skipping zones it already finished')
+    parser.add_argument('--engine', choices=('sync', 'async'), default='sync',
+                        help="Use threads ('sync') or asyncio with httpx ('async') for API calls\n(default: sync)")
+    parser.add_argument('--max-in-flight', metavar='N', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help=f'Concurrent requests for --engine async (default: {DEFAULT_MAX_IN_FLIGHT})')
+    args = parser.parse_args()
+    global REPORT_FILE, SKIPPED_ROWS, CLIENT, RECORD_CACHE, METRICS_OUT, TARGET_DOMAIN, JOURNAL_FILE
+    if args.jobs and args.watch:
+        parser.error('--jobs cannot be combined with --watch')
+    if args.resume and (args.watch or args.backup or args.restore):
+        parser.error('--resume only applies to update runs')
+    if args.list_snapshots and not args.snapshot_dir:
+        parser.error('--list-snapshots requires --snapshot-dir')
+    if args.engine == 'async' and not async_engine_available():
+        parser.error('--engine async requires the httpx package (pip install httpx)')
+    init_colors()
+    # Configure logging before the first message; init_env settles DEBUG later
+    # and may prompt for it, so the log file is set up again if it changed
+    debug_log = os.getenv('DEBUG', '0').lower() in ('1', 'true')
+    setup_logging(args.quiet, args.log_format, args.log_file or (DEFAULT_DEBUG_FILE if debug_log else None), debug_log)
+    if not args.no_update_check:
+        check_for_update(prompt=not args.jobs)
+    init_env(require_new_ip=not (args.watch or args.jobs), interactive=not args.jobs)
+    if DEBUG != debug_log:
+        setup_logging(args.quiet, args.log_format, args.log_file or (DEFAULT_DEBUG_FILE if DEBUG else None), DEBUG)
+    if args.quiet or args.log_format == 'json':
+        log_info("Starting Cloudflare DNS update script for %s", TARGET_DOMAIN or 'all zones')
+    else:
+        if not args.no_banner:
+            print_banner()
+        print("\n" + "="*50)
+        print(f"{GREEN}🚀 Starting Cloudflare DNS update script for {TARGET_DOMAIN or 'all zones'}!{RESET}")
+        print("="*50 + "\n")
+        print_censored_env()
+    REPORT_FILE = args.report
+    SKIPPED_ROWS = args.skipped_rows
+    METRICS_OUT = args.metrics_out
+    JOURNAL_FILE = args.journal
+    CLIENT = CloudflareClient(
+        HEADERS,
+        rate_limiter=RateLimiter(args.rate_limit) if args.rate_limit > 0 else None,
+        # Each worker may hold a connection for its page prefetch as well
+        pool_size=max(DEFAULT_POOL_SIZE, args.concurrency * 2),
+        timeout=args.timeout,
+        max_retries=args.retries,
+    )
+
+    if args.list_snapshots:
+        SnapshotStore(args.snapshot_dir).print_snapshots()
+        return
+    if args.backup or args.restore:
+        with METRICS.phase('backup' if args.backup else 'restore'):
+            entries = None
+            if args.snapshot_dir and args.restore:
+                store = SnapshotStore(args.snapshot_dir)
+                try:
+                    manifest = store.load_manifest(args.snapshot)
+                except (OSError, ValueError) as e:
+                    log_error(f"Cannot restore snapshot: {e}")
+                    sys.exit(1)
+                log_info(f"Restoring snapshot {manifest['id']} ({len(manifest['zones'])} zones)")
+                if manifest.get('failed'):
+                    log_error(f"Snapshot {manifest['id']} is incomplete; these zones failed when it was taken "
+                              f"and are not restored: {', '.join(manifest['failed'])}")
+                entries = store.iter_snapshot(manifest)
+            if args.snapshot_dir and args.backup:
+                # Snapshots fetch zones on the threaded client with either engine
+                SnapshotStore(args.snapshot_dir).snapshot(get_zones(), args.concurrency)
+            elif args.engine == 'async':
+                import asyncio
+                asyncio.run(run_async_backup_restore(args.backup, args.backup_file, args.concurrency, args.max_in_flight,
+                                                     entries))
+            elif args.backup:
+                backup_records(get_zones(), args.backup_file)
+            else:
+                restore_records(args.backup_file, entries)
+        if METRICS_OUT:
+            METRICS.write(METRICS_OUT)
+        return
+    try:
+        if args.jobs:
+            jobs = load_jobs(args.jobs)
+            # Jobs select their own zones
+            TARGET_DOMAIN = None
+        else:
+            jobs = [build_default_job()]
+    except (OSError, ValueError) as e:
+        log_error(f"Invalid job file: {e}" if args.jobs else f"Invalid IP configuration: {e}")
+        sys.exit(1)
+    if args.cache_ttl > 0:
+        RECORD_CACHE = RecordCache(args.cache_file, args.cache_ttl)
+    if args.watch:
+        watch_ip(args.ip_source, args.watch_interval,
+                 lambda: run_update(args.concurrency, engine=args.engine, max_in_flight=args.max_in_flight,
+                                    resume_hint=False))
+        return
+    run_update(args.concurrency, jobs, args.engine, args.max_in_flight, resume=args.resume)
+    if INTERACTIVE_ENV and sys.stdin.isatty():
+        input("\nPress Enter to exit...")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,411 @@
+"""Benchmark CloudflareUpdate.py against a local mock of the Cloudflare API.
+
+The mock server emulates ``/zones``, ``/zones/<id>/dns_records`` (including
+pagination, filtering, single and batch writes) and optional rate limiting
+with configurable latency. Synthetic accounts are generated on the fly, so
+even very large accounts cost the harness almost no memory.
+
+Every scenario runs CloudflareUpdate.py's ``main()`` in a child process and
+reports the API requests it issued, wall time and peak RSS of that process.
+
+Example::
+
+    python benchmark.py --zones 1000 --records 200 --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OLD_IP = '192.0.2.10'
+NEW_IP = '198.51.100.20'
+SCENARIOS = ('backup', 'update', 'restore')
+# Record layout repeated through every synthetic zone: (type, content template)
+RECORD_PATTERN = [
+    ('A', OLD_IP),
+    ('CNAME', 'origin-{i}.example.net'),
+    ('TXT', 'v=spf1 ip4:' + OLD_IP + ' ip4:10.{i}.0.1 -all'),
+    ('MX', 'mail{i}.example.net'),
+    ('AAAA', '2001:db8::{i:x}'),
+    ('CNAME', 'www-{i}.example.net'),
+    ('TXT', 'verification-token-{i}'),
+    ('A', '203.0.113.{n}'),
+]
+
+
+class MockAccount:
+    """Synthetic Cloudflare account with ``zones`` zones of ``records`` records each.
+
+    Records are derived from their index on demand; only records changed
+    through the API are stored.
+    """
+
+    def __init__(self, zones, records):
+        self.zone_count = zones
+        self.record_count = records
+        self.overrides = {}
+        self.created = {}
+        self.lock = threading.Lock()
+
+    def zone(self, index):
+        return {
+            'id': f'{index:032x}',
+            'name': f'bench-zone-{index}.example',
+            'status': 'active',
+            'modified_on': '2024-01-01T00:00:00.000000Z',
+        }
+
+    def zones(self):
+        return [self.zone(i) for i in range(self.zone_count)]
+
+    def zone_index(self, zone_id):
+        try:
+            index = int(zone_id, 16)
+        except ValueError:
+            return None
+        return index if index < self.zone_count else None
+
+    def generated(self, zone_index, i):
+        rtype, template = RECORD_PATTERN[i % len(RECORD_PATTERN)]
+        zone = self.zone(zone_index)
+        return {
+            'id': f'{zone_index:08x}{i:024x}',
+            'zone_id': zone['id'],
+            'zone_name': zone['name'],
+            'name': f'host-{i}.{zone["name"]}',
+            'type': rtype,
+            'content': template.format(i=i, n=i % 250 + 1),
+            'proxiable': rtype in ('A', 'AAAA', 'CNAME'),
+            'proxied': False,
+            'ttl': 1,
+            'settings': {},
+            'meta': {'auto_added': False, 'managed_by_apps': False, 'managed_by_argo_tunnel': False},
+            'comment': None,
+            'tags': [],
+            'created_on': '2024-01-01T00:00:00.000000Z',
+            'modified_on': '2024-01-01T00:00:00.000000Z',
+        }
+
+    def records(self, zone_index):
+        with self.lock:
+            overrides = dict(self.overrides)
+            created = list(self.created.get(zone_index, []))
+        for i in range(self.record_count):
+            rec = self.generated(zone_index, i)
+            yield overrides.get(rec['id'], rec)
+        yield from created
+
+    def find(self, zone_index, record_id):
+        with self.lock:
+            if record_id in self.overrides:
+                return self.overrides[record_id]
+            for rec in self.created.get(zone_index, []):
+                if rec['id'] == record_id:
+                    return rec
+        if record_id[:8] != f'{zone_index:08x}':
+            return None
+        i = int(record_id[8:], 16)
+        return self.generated(zone_index, i) if i < self.record_count else None
+
+    def put(self, zone_index, record_id, body):
+        current = self.find(zone_index, record_id)
+        if current is None:
+            return None
+        updated = {**current, **body, 'id': record_id, 'modified_on': time.strftime('%Y-%m-%dT%H:%M:%S.000000Z')}
+        with self.lock:
+            self.overrides[record_id] = updated
+        return updated
+
+    def post(self, zone_index, body):
+        zone = self.zone(zone_index)
+        with self.lock:
+            created = self.created.setdefault(zone_index, [])
+            rec = {**body, 'id': f'{zone_index:08x}ff{len(created):022x}',
+                   'zone_id': zone['id'], 'zone_name': zone['name']}
+            created.append(rec)
+        return rec
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP server holding the mock account, request counters and rate limit state."""
+
+    daemon_threads = True
+
+    def __init__(self, account, latency=0.0, rate_limit=0, window=1.0):
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        self.account = account
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.throttled = 0
+
+    def admit(self):
+        """Count a request; return False if it exceeds the emulated rate limit."""
+        with self.lock:
+            self.requests += 1
+            if not self.rate_limit:
+                return True
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.window_count > self.rate_limit:
+                self.throttled += 1
+                return False
+            return True
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/client/v4'
+
+
+def zone_name_matches(name, value):
+    """Apply a zones ``name`` filter, which may carry a ``starts_with:``, ``ends_with:`` or ``contains:`` operator."""
+    operator, sep, operand = value.partition(':')
+    if sep and operator == 'starts_with':
+        return name.startswith(operand)
+    if sep and operator == 'ends_with':
+        return name.endswith(operand)
+    if sep and operator == 'contains':
+        return operand in name
+    return name == value
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Request handler emulating the subset of the Cloudflare v4 API the tool uses."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, every
+    # response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {'success': False, 'errors': [{'code': status, 'message': message}],
+                                'result': None}, headers)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def route(self):
+        """Admit the request and return ``(path, query)`` relative to the API root."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.server.admit():
+            self.send_error_json(429, 'Rate limited', {'Retry-After': f'{self.server.window:g}'})
+            return None, None
+        url = urlparse(self.path)
+        path = url.path[len('/client/v4'):] if url.path.startswith('/client/v4') else url.path
+        return path.rstrip('/'), parse_qs(url.query)
+
+    def send_page(self, items, query, max_per_page):
+        per_page = min(int(query.get('per_page', ['20'])[0]), max_per_page)
+        page = max(1, int(query.get('page', ['1'])[0]))
+        start = (page - 1) * per_page
+        result = []
+        total = 0
+        for item in items:
+            if start <= total < start + per_page:
+                result.append(item)
+            total += 1
+        self.send_json(200, {
+            'success': True,
+            'errors': [],
+            'result': result,
+            'result_info': {'page': page, 'per_page': per_page, 'count': len(result),
+                            'total_count': total, 'total_pages': max(1, -(-total // per_page))},
+        })
+
+    def do_GET(self):
+        path, query = self.route()
+        if path is None:
+            return
+        account = self.server.account
+        if path == '/zones':
+            zones = account.zones()
+            if 'name' in query:
+                zones = [z for z in zones if zone_name_matches(z['name'], query['name'][0])]
+            return self.send_page(zones, query, 50)
+        match = re.fullmatch(r'/zones/([^/]+)/dns_records', path)
+        zone_index = account.zone_index(match.group(1)) if match else None
+        if zone_index is None:
+            return self.send_error_json(404, 'Not found')
+        records = account.records(zone_index)
+        if 'type' in query:
+            types = set(query['type'][0].split(','))
+            records = (r for r in records if r['type'] in types)
+        if 'content' in query:
+            records = (r for r in records if r['content'] == query['content'][0])
+        if 'content.exact' in query:
+            records = (r for r in records if r['content'] == query['content.exact'][0])
+        if 'content.contains' in query:
+            records = (r for r in records if query['content.contains'][0] in r['content'])
+        if 'name.contains' in query:
+            records = (r for r in records if query['name.contains'][0] in r['name'])
+        self.send_page(records, query, 5000)
+
+    def do_PUT(self):
+        path, _ = self.route()
+        if path is None:
+            return
+        match = re.fullmatch(r'/zones/([^/]+)/dns_records/([^/]+)', path)
+        zone_index = self.server.account.zone_index(match.group(1)) if match else None
+        body = self.read_body()
+        rec = self.server.account.put(zone_index, match.group(2), body) if zone_index is not None else None
+        if rec is None:
+            return self.send_error_json(404, 'Record not found')
+        self.send_json(200, {'success': True, 'errors': [], 'result': rec})
+
+    def do_POST(self):
+        path, _ = self.route()
+        if path is None:
+            return
+        account = self.server.account
+        match = re.fullmatch(r'/zones/([^/]+)/dns_records(/batch)?', path)
+        zone_index = account.zone_index(match.group(1)) if match else None
+        if zone_index is None:
+            return self.send_error_json(404, 'Not found')
+        body = self.read_body()
+        if not match.group(2):
+            return self.send_json(200, {'success': True, 'errors': [], 'result': account.post(zone_index, body)})
+        # Batches are atomic: validate every put before applying any of them
+        puts = body.get('puts') or []
+        if any(account.find(zone_index, put.get('id', '')) is None for put in puts):
+            return self.send_error_json(400, 'Batch references an unknown record')
+        result = {
+            'deletes': [],
+            'patches': [],
+            'puts': [account.put(zone_index, put['id'], put) for put in puts],
+            'posts': [account.post(zone_index, post) for post in body.get('posts') or []],
+        }
+        self.send_json(200, {'success': True, 'errors': [], 'result': result})
+
+
+def run_child(mode, api_base, backup_file, extra_args):
+    """Entry point of the child process: drive CloudflareUpdate.main() for one scenario."""
+    sys.path.insert(0, HERE)
+    import CloudflareUpdate
+
+    CloudflareUpdate.API_BASE = api_base
+    # The version check talks to npm/GitHub and is not part of the benchmark
+    argv = ['CloudflareUpdate.py', '--no-update-check', '--no-banner', '--backup-file', backup_file, *extra_args]
+    if mode == 'backup':
+        argv.append('--backup')
+    elif mode == 'restore':
+        argv.append('--restore')
+    sys.argv = argv
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    CloudflareUpdate.main()
+
+
+def run_scenario(server, mode, backup_file, extra_args, target_domain=''):
+    """Run one scenario in a child process and return its measurements."""
+    env = dict(os.environ, CLOUDFLARE_API_TOKEN='benchmark-token', NEW_IP=NEW_IP, OLD_IP=OLD_IP,
+               DRY_RUN='0', DEBUG='0', CENSOR='1', TARGET_DOMAIN=target_domain)
+    # Keep the run journal next to the backup so nothing is left behind in the repo
+    journal = os.path.join(os.path.dirname(backup_file), 'bench_journal.jsonl')
+    cmd = [sys.executable, os.path.abspath(__file__), '_child', mode, server.base_url, backup_file,
+           '--journal', journal, *extra_args]
+    server.reset()
+    start = time.perf_counter()
+    # The child needs a .env-style file next to it to skip the interactive prompts
+    proc = subprocess.Popen(cmd, env=env, cwd=HERE, stdin=subprocess.DEVNULL)
+    peak_rss_kb = None
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    else:
+        proc.wait()
+    elapsed = time.perf_counter() - start
+    return {
+        'scenario': mode,
+        'exit_code': proc.returncode,
+        'requests': server.requests,
+        'throttled': server.throttled,
+        'wall_time_s': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1) if peak_rss_kb is not None else None,
+    }
+
+
+def print_results(results):
+    print(f"{'scenario':<10} {'requests':>9} {'429s':>6} {'wall (s)':>9} {'peak RSS (MB)':>14} {'exit':>5}")
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else 'n/a'
+        print(f"{r['scenario']:<10} {r['requests']:>9} {r['throttled']:>6} {r['wall_time_s']:>9.3f} {rss:>14} {r['exit_code']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CloudflareUpdate.py against a local mock Cloudflare API')
+    parser.add_argument('--zones', type=int, default=50, help='Number of synthetic zones (default: 50)')
+    parser.add_argument('--records', type=int, default=200, help='Records per zone (default: 200)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency added to every mock API response')
+    parser.add_argument('--server-rate-limit', type=int, default=0, metavar='N',
+                        help='Answer with 429 after N requests per second (default: 0, unlimited)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'Comma-separated scenarios to run in order (default: {",".join(SCENARIOS)})')
+    parser.add_argument('--target-domain', default='', metavar='ZONES',
+                        help='TARGET_DOMAIN for the client, e.g. "bench-zone-1*" (default: all zones)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON to FILE')
+    parser.add_argument('client_args', nargs=argparse.REMAINDER,
+                        help='Arguments after "--" are passed to CloudflareUpdate.py '
+                             '(default: --rate-limit 0)')
+    args = parser.parse_args()
+    client_args = [a for a in args.client_args if a != '--'] or ['--rate-limit', '0']
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    server = MockServer(MockAccount(args.zones, args.records), args.latency_ms / 1000, args.server_rate_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Mock API at {server.base_url}: {args.zones} zones x {args.records} records")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        backup_file = os.path.join(tmp, 'bench_backup.jsonl')
+        for mode in scenarios:
+            results.append(run_scenario(server, mode, backup_file, client_args, args.target_domain))
+    server.shutdown()
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'zones': args.zones, 'records': args.records, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '_child':
+        run_child(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5:])
+    else:
+        main()